@@ -1,12 +1,20 @@
-from gpiozero import LED, Buzzer as GpioZeroBuzzer
-from gpiozero.pins.lgpio import LGPIOFactory
-from gpiozero import Device
+from gpiozero import PWMLED, Buzzer as GpioZeroBuzzer
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial, wraps
+import os
+import threading
 import time
-import adafruit_dht
-import board
-
-# Set the pin factory to lgpio for Raspberry Pi 5 / newer OS
-Device.pin_factory = LGPIOFactory()
+import uuid
+from backends import (acquire_gpio_lock, create_dht_sensor, create_pin_factory,
+                      release_gpio_lock, resolve_backend)
+from sensors import DHTSampler, ReadingHistory
+from scheduler import Scheduler
+from blink import BlinkEngine
+from buzzer import BuzzerPlayer
+from fades import FadeEngine
+from scenes import SCENES, CompiledScene, SceneEngine, compile_scene
+from metrics import histogram, timed
 
 # Raspberry Pi Physical Pin Numbers (Board mode) -> BCM GPIO mapping
 # Buzzer - Pin 11 -> GPIO 17
@@ -15,298 +23,485 @@ Device.pin_factory = LGPIOFactory()
 # Red LED - Pin 36 -> GPIO 16
 # DHT11 - Pin 32 -> GPIO 12
 
+class FrozenStates(dict):
+    """Read-only dict, so a published snapshot can be shared without copying"""
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('State snapshots are read-only')
+    
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+OPERATION_SECONDS = histogram(
+    'led_operation_duration_seconds',
+    'Time spent in LEDController operations, including waiting for the lock',
+    ['operation']
+)
+
+# Software PWM frequency of the LED pins (Hz) and brightness updates per second during fades
+PWM_FREQUENCY = int(os.environ.get('LED_PWM_FREQUENCY', 100))
+FADE_RATE = float(os.environ.get('LED_FADE_RATE', 50))
+
+# How far back the DHT history reaches, in seconds
+DHT_HISTORY_SECONDS = 7 * 24 * 3600
+
+# Published controller state; replaced as a whole on every change
+StateSnapshot = namedtuple('StateSnapshot', ['version', 'states'])
+
+def _locked(method):
+    """Run a controller method while holding the controller lock"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+# Default wiring, BCM GPIO numbers; other boards pass their own (see devices.json)
+DEFAULT_CHANNELS = {
+    'green': 21,    # Physical Pin 40
+    'blue': 20,     # Physical Pin 38
+    'red': 16       # Physical Pin 36
+}
+DEFAULT_BUZZER_GPIO = 17    # Physical Pin 11
+DEFAULT_DHT_GPIO = 12       # Physical Pin 32
+
+# Each channel has an on and a blink flag and the buzzer one more; the telemetry
+# records and the packed states format hold these flags in 32 bits
+MAX_CHANNELS = 15
+
 class LEDController:
-    def __init__(self):
+    def __init__(self, backend=None, channels=None, buzzer_gpio=DEFAULT_BUZZER_GPIO,
+                 dht_gpio=DEFAULT_DHT_GPIO):
+        # 'lgpio' drives the real pins, 'mock' simulates them (see backends.py)
+        self.backend = resolve_backend(backend)
+        # Real pins belong to exactly one process, whatever server runs us
+        self._gpio_lock = acquire_gpio_lock() if self.backend == 'lgpio' else None
+        self.pin_factory = create_pin_factory(self.backend)
+        self._closed = False
+        
         # BCM GPIO numbers
-        self.BUZZER_GPIO = 17   # Physical Pin 11
-        self.GREEN_GPIO = 21    # Physical Pin 40
-        self.BLUE_GPIO = 20     # Physical Pin 38
-        self.RED_GPIO = 16      # Physical Pin 36
-        self.DHT_GPIO = 12      # Physical Pin 32
+        self.BUZZER_GPIO = buzzer_gpio
+        self.DHT_GPIO = dht_gpio
+        self.channel_pins = dict(channels or DEFAULT_CHANNELS)
+        if len(self.channel_pins) > MAX_CHANNELS:
+            raise ValueError(f'At most {MAX_CHANNELS} channels per board')
         
-        # Initialize components using gpiozero
-        self.green_led = LED(self.GREEN_GPIO)
-        self.blue_led = LED(self.BLUE_GPIO)
-        self.red_led = LED(self.RED_GPIO)
-        self.buzzer = GpioZeroBuzzer(self.BUZZER_GPIO)
+        # Initialize components using gpiozero; every on/off/blink output is a
+        # channel in this table and is driven by the generic operations below.
+        # PWMLEDs also take a brightness (value 0-1); the default pins have no
+        # hardware PWM, so the pin factory times it in software
+        self.leds = {
+            channel: PWMLED(gpio, frequency=PWM_FREQUENCY, pin_factory=self.pin_factory)
+            for channel, gpio in self.channel_pins.items()
+        }
+        self.buzzer = GpioZeroBuzzer(self.BUZZER_GPIO, pin_factory=self.pin_factory)
         
-        # Initialize DHT11 sensor
-        self.dht_sensor = adafruit_dht.DHT11(board.D12)
+        # DHT11 sensor; the sampler thread opens it on its first read, so a slow
+        # driver import or a missing sensor does not hold up the server
+        self.dht_sampler = DHTSampler(
+            sensor_factory=partial(create_dht_sensor, self.backend, self.DHT_GPIO),
+            on_sample=self._on_dht_sample
+        )
+        # A week of samples at the sampler's rate (~4.8 MB at one read per 2 s)
+        self.dht_history = ReadingHistory(DHT_HISTORY_SECONDS / self.dht_sampler.interval)
+        self.dht_sampler.history = self.dht_history
+        self._last_dht = {}
         
-        # Initial state - all off
-        self.led_states = {
-            'green': False,
-            'blue': False,
-            'red': False,
-            'buzzer': False,
-            'green_blink': False,
-            'blue_blink': False,
-            'red_blink': False
-        }
+        # Initial state - all off. Readers take the current snapshot without
+        # locking; writers build a new one under the lock and bump the version
+        self._snapshot = StateSnapshot(0, FrozenStates(self._all_states(False, buzzer=False)))
+        # Versions restart at 0 in every process; the boot id tells them apart
+        self.boot_id = uuid.uuid4().hex[:12]
+        
+        # Change-notification hooks, called with only the fields that changed
+        self._listeners = []
+        # Called with every good DHT reading, changed or not
+        self._sample_listeners = []
         
-        # Blinking threads
-        self.blink_threads = {}
-        self.stop_blink_flags = {}
+        # Serializes every state change; re-entrant so batches can nest calls
+        self.lock = threading.RLock()
+        self._batch_depth = 0
+        self._batched_changes = {}
+        self._working_states = None       # unpublished states inside a batch
+        
+        # One timer thread drives every blinking output
+        self.scheduler = Scheduler()
+        self.blink_engine = BlinkEngine(self.scheduler)
+        self.scene_engine = SceneEngine(self.scheduler)
+        self.fade_engine = FadeEngine(self.scheduler, rate=FADE_RATE,
+                                      on_progress=self._on_fade_progress)
+        self.scenes = {}
+        for name, definition in SCENES.items():
+            try:
+                self.scenes[name] = compile_scene(name, definition, self.channels)
+            except ValueError:
+                pass    # uses channels this board does not have
+        self.buzzer_player = BuzzerPlayer(
+            self.buzzer, self.scheduler,
+            on_change=self._on_buzzer_change
+        )
+        self.scheduler.start()
         
         # Turn all off initially
         self.all_off()
-    
-    def turn_on_green(self):
-        self.stop_blink_flags['green'] = True
-        self.green_led.on()
-        self.led_states['green'] = True
-        self.led_states['green_blink'] = False
         
-    def turn_off_green(self):
-        self.stop_blink_flags['green'] = True
-        self.green_led.off()
-        self.led_states['green'] = False
-        self.led_states['green_blink'] = False
-    
-    def turn_on_blue(self):
-        self.stop_blink_flags['blue'] = True
-        self.blue_led.on()
-        self.led_states['blue'] = True
-        self.led_states['blue_blink'] = False
-    
-    def turn_off_blue(self):
-        self.stop_blink_flags['blue'] = True
-        self.blue_led.off()
-        self.led_states['blue'] = False
-        self.led_states['blue_blink'] = False
-    
-    def turn_on_red(self):
-        self.stop_blink_flags['red'] = True
-        self.red_led.on()
-        self.led_states['red'] = True
-        self.led_states['red_blink'] = False
-    
-    def turn_off_red(self):
-        self.stop_blink_flags['red'] = True
-        self.red_led.off()
-        self.led_states['red'] = False
-        self.led_states['red_blink'] = False
-    
-    def toggle_green(self):
-        if self.led_states['green']:
-            self.turn_off_green()
-        else:
-            self.turn_on_green()
-        return self.led_states['green']
+        self.dht_sampler.start()
     
-    def toggle_blue(self):
-        if self.led_states['blue']:
-            self.turn_off_blue()
-        else:
-            self.turn_on_blue()
-        return self.led_states['blue']
+    def add_listener(self, callback):
+        """Register callback(changes) fired on every state change or new DHT value"""
+        self._listeners.append(callback)
     
-    def toggle_red(self):
-        if self.led_states['red']:
-            self.turn_off_red()
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def add_sample_listener(self, callback):
+        """Register callback(temperature, humidity) run on the sampler thread for each reading"""
+        self._sample_listeners.append(callback)
+    
+    def _notify(self, changes):
+        for callback in list(self._listeners):
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"State listener error: {e}")
+    
+    @property
+    def led_states(self):
+        return self._snapshot.states
+    
+    def _current_states(self):
+        """States as seen by the lock holder, including unpublished batch changes"""
+        if self._working_states is not None:
+            return self._working_states
+        return self._snapshot.states
+    
+    def _publish(self, states, changed):
+        version = self._snapshot.version + 1
+        self._snapshot = StateSnapshot(version, FrozenStates(states))
+        self._notify({'states': changed, 'version': version})
+    
+    @contextmanager
+    def batch(self):
+        """Hold the lock across several operations and publish one snapshot"""
+        with self.lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._batched_changes:
+                    states = self._working_states
+                    published = self._snapshot.states
+                    # Drop fields that were changed and then changed back
+                    changed = {k: v for k, v in self._batched_changes.items()
+                               if published.get(k) != v}
+                    self._working_states, self._batched_changes = None, {}
+                    if changed:
+                        self._publish(states, changed)
+    
+    @_locked
+    def _update_states(self, **changes):
+        """Apply state changes and publish a new snapshot if anything differs"""
+        current = self._current_states()
+        changed = {k: v for k, v in changes.items() if current.get(k) != v}
+        if not changed:
+            return
+        if self._batch_depth:
+            if self._working_states is None:
+                self._working_states = dict(current)
+            self._working_states.update(changed)
+            self._batched_changes.update(changed)
         else:
-            self.turn_on_red()
-        return self.led_states['red']
+            states = dict(current)
+            states.update(changed)
+            self._publish(states, changed)
     
-    def buzz(self, duration=0.5):
-        """Trigger buzzer for a short duration"""
-        self.buzzer.on()
-        self.led_states['buzzer'] = True
-        time.sleep(duration)
-        self.buzzer.off()
-        self.led_states['buzzer'] = False
+    def _on_dht_sample(self, temperature, humidity):
+        """Called from the sampler thread after each good reading"""
+        for callback in list(self._sample_listeners):
+            try:
+                callback(temperature, humidity)
+            except Exception as e:
+                print(f"Sample listener error: {e}")
+        sample = {'temperature': temperature, 'humidity': humidity}
+        changed = {k: v for k, v in sample.items() if self._last_dht.get(k) != v}
+        self._last_dht = sample
+        if changed:
+            self._notify({'dht': changed})
     
-    def buzzer_on(self):
-        self.buzzer.on()
-        self.led_states['buzzer'] = True
-        
-    def buzzer_off(self):
-        self.buzzer.off()
-        self.led_states['buzzer'] = False
+    @property
+    def channels(self):
+        """Names of the on/off/blink outputs"""
+        return tuple(self.leds)
+    
+    def _all_states(self, on, blink=False, **extra):
+        states = {}
+        for channel in self.leds:
+            states[channel] = on
+            states[f'{channel}_blink'] = blink
+            states[f'{channel}_brightness'] = 1.0 if on else 0.0
+        states.update(extra)
+        return states
     
-    def _blink_continuous(self, led, color, interval=0.5):
-        """Continuous blinking in a thread"""
-        while not self.stop_blink_flags.get(color, False):
+    @timed(OPERATION_SECONDS, 'set')
+    @_locked
+    def set(self, channel, on):
+        """Switch a channel on or off, stopping any blink on it"""
+        led = self.leds[channel]
+        self._release(channel)
+        if on:
             led.on()
-            time.sleep(interval)
+        else:
             led.off()
-            time.sleep(interval)
+        self._update_states(**{channel: on, f'{channel}_blink': False,
+                               f'{channel}_brightness': 1.0 if on else 0.0})
     
-    def blink_green(self, times=None, interval=0.5):
-        """Blink green LED - continuous if times=None"""
-        import threading
-        
-        # Stop any existing blink
-        self.stop_blink_flags['green'] = True
-        if 'green' in self.blink_threads:
-            self.blink_threads['green'].join(timeout=1)
-        
-        if times is None:
-            # Continuous blinking
-            self.stop_blink_flags['green'] = False
-            thread = threading.Thread(target=self._blink_continuous, args=(self.green_led, 'green', interval))
-            thread.daemon = True
-            thread.start()
-            self.blink_threads['green'] = thread
-            self.led_states['green'] = False
-            self.led_states['green_blink'] = True
-        else:
-            # Fixed number of blinks
-            for _ in range(times):
-                self.green_led.on()
-                time.sleep(interval)
-                self.green_led.off()
-                time.sleep(interval)
-            self.led_states['green'] = False
-            self.led_states['green_blink'] = False
-    
-    def blink_blue(self, times=None, interval=0.5):
-        """Blink blue LED - continuous if times=None"""
-        import threading
-        
-        # Stop any existing blink
-        self.stop_blink_flags['blue'] = True
-        if 'blue' in self.blink_threads:
-            self.blink_threads['blue'].join(timeout=1)
-        
-        if times is None:
-            # Continuous blinking
-            self.stop_blink_flags['blue'] = False
-            thread = threading.Thread(target=self._blink_continuous, args=(self.blue_led, 'blue', interval))
-            thread.daemon = True
-            thread.start()
-            self.blink_threads['blue'] = thread
-            self.led_states['blue'] = False
-            self.led_states['blue_blink'] = True
-        else:
-            # Fixed number of blinks
-            for _ in range(times):
-                self.blue_led.on()
-                time.sleep(interval)
-                self.blue_led.off()
-                time.sleep(interval)
-            self.led_states['blue'] = False
-            self.led_states['blue_blink'] = False
-    
-    def blink_red(self, times=None, interval=0.5):
-        """Blink red LED - continuous if times=None"""
-        import threading
+    def _release(self, channel):
+        """Take a channel back from any blink, scene or fade driving it"""
+        self.blink_engine.stop(channel)
+        self.scene_engine.release(channel)
+        self.fade_engine.stop(channel)
+    
+    @timed(OPERATION_SECONDS, 'set_brightness')
+    @_locked
+    def set_brightness(self, channel, level):
+        """Set a channel's PWM brightness (0-1), stopping any blink, scene or fade"""
+        level = min(max(float(level), 0.0), 1.0)
+        self._release(channel)
+        self.leds[channel].value = level
+        self._update_states(**{channel: level > 0, f'{channel}_blink': False,
+                               f'{channel}_brightness': round(level, 3)})
+    
+    @timed(OPERATION_SECONDS, 'fade')
+    @_locked
+    def fade(self, channel, level, duration=1.0):
+        """Ramp a channel to brightness level over duration seconds, in the background"""
+        level = min(max(float(level), 0.0), 1.0)
+        led = self.leds[channel]
+        self.blink_engine.stop(channel)
+        self.scene_engine.release(channel)
+        fade = self.fade_engine.fade(channel, led, level, duration)
+        self._update_states(**{f'{channel}_blink': False})
+        return fade
+    
+    @_locked
+    def _on_fade_progress(self, fade):
+        """Publish the live brightness of a fading channel (about 10 times a second)"""
+        channel = fade.channel
+        if self.blink_engine.is_blinking(channel):
+            return
+        scene = self.scene_engine.current()
+        if scene is not None and channel in scene.leds:
+            return
+        # The pin is the source of truth, even if the fade was just replaced
+        value = self.leds[channel].value
+        self._update_states(**{channel: value > 0, f'{channel}_brightness': round(value, 3)})
+    
+    @_locked
+    def _on_buzzer_change(self, on):
+        """Publish the buzzer pin's state after the player switches it
         
-        # Stop any existing blink
-        self.stop_blink_flags['red'] = True
-        if 'red' in self.blink_threads:
-            self.blink_threads['red'].join(timeout=1)
+        Switch events are reported after the player's lock is released, so two
+        threads can deliver them out of order; the pin, read under the
+        controller lock, cannot be stale.
+        """
+        self._update_states(buzzer=self.buzzer.is_active)
+    
+    @timed(OPERATION_SECONDS, 'toggle')
+    @_locked
+    def toggle(self, channel):
+        on = not self._current_states()[channel]
+        self.set(channel, on)
+        return on
+    
+    @timed(OPERATION_SECONDS, 'buzz')
+    def buzz(self, duration=0.5, priority=0):
+        """Queue a single beep; returns immediately"""
+        return self.buzzer_player.play([(duration, 0)], priority)
+    
+    @timed(OPERATION_SECONDS, 'buzz_pattern')
+    def buzz_pattern(self, pattern, priority=0):
+        """Queue a sequence of (on_seconds, gap_seconds) beeps"""
+        return self.buzzer_player.play(pattern, priority)
+    
+    def get_buzzer_status(self):
+        return self.buzzer_player.status()
+    
+    @timed(OPERATION_SECONDS, 'buzzer_on')
+    @_locked
+    def buzzer_on(self):
+        self.buzzer_player.stop()
+        self.buzzer.on()
+        self._update_states(buzzer=True)
         
-        if times is None:
-            # Continuous blinking
-            self.stop_blink_flags['red'] = False
-            thread = threading.Thread(target=self._blink_continuous, args=(self.red_led, 'red', interval))
-            thread.daemon = True
-            thread.start()
-            self.blink_threads['red'] = thread
-            self.led_states['red'] = False
-            self.led_states['red_blink'] = True
-        else:
-            # Fixed number of blinks
-            for _ in range(times):
-                self.red_led.on()
-                time.sleep(interval)
-                self.red_led.off()
-                time.sleep(interval)
-            self.led_states['red'] = False
-            self.led_states['red_blink'] = False
+    @timed(OPERATION_SECONDS, 'buzzer_off')
+    @_locked
+    def buzzer_off(self):
+        self.buzzer_player.stop()
+    
+    @timed(OPERATION_SECONDS, 'blink')
+    @_locked
+    def blink(self, channel, times=None, interval=0.5):
+        """Blink a channel - continuous if times=None, else returns a BlinkJob"""
+        self.scene_engine.release(channel)
+        self.fade_engine.stop(channel)
+        job = self.blink_engine.blink(channel, self.leds[channel], interval, times,
+                                      on_complete=self._on_blink_job_done)
+        self._update_states(**{channel: False, f'{channel}_blink': True,
+                               f'{channel}_brightness': 0.0})
+        return job
     
+    @timed(OPERATION_SECONDS, 'blink_all')
+    @_locked
     def blink_all(self, times=None, interval=0.5):
-        """Blink all LEDs"""
-        if times is None:
-            # Start all continuous blinking
-            self.blink_green(times=None, interval=interval)
-            self.blink_blue(times=None, interval=interval)
-            self.blink_red(times=None, interval=interval)
-        else:
-            # Fixed number of blinks
-            for _ in range(times):
-                self.green_led.on()
-                self.blue_led.on()
-                self.red_led.on()
-                time.sleep(interval)
-                self.green_led.off()
-                self.blue_led.off()
-                self.red_led.off()
-                time.sleep(interval)
-            self.led_states['green'] = False
-            self.led_states['blue'] = False
-            self.led_states['red'] = False
-            self.led_states['green_blink'] = False
-            self.led_states['blue_blink'] = False
-            self.led_states['red_blink'] = False
+        """Blink all LEDs as one phase-locked group"""
+        self.scene_engine.stop()
+        self.fade_engine.stop_all()
+        job = self.blink_engine.blink_many(self.leds, interval, times,
+                                           on_complete=self._on_blink_job_done)
+        self._update_states(**self._all_states(False, blink=True))
+        return job
+    
+    @_locked
+    def _on_blink_job_done(self, job):
+        """Clear the blink flags of channels a fixed-count blink still owned"""
+        changes = {}
+        for channel in job.channels:
+            if not self.blink_engine.is_blinking(channel) and self._current_states().get(f'{channel}_blink'):
+                changes[channel] = False
+                changes[f'{channel}_blink'] = False
+        self._update_states(**changes)
+    
+    def get_blink_job(self, job_id):
+        return self.blink_engine.get_job(job_id)
     
+    @timed(OPERATION_SECONDS, 'cancel_blink_job')
+    @_locked
+    def cancel_blink_job(self, job_id):
+        return self.blink_engine.cancel_job(job_id)
+    
+    @timed(OPERATION_SECONDS, 'all_off')
+    @_locked
     def all_off(self):
-        # Stop all blinking
-        for color in ['green', 'blue', 'red']:
-            self.stop_blink_flags[color] = True
+        # Stop all blinking, fades and any scene
+        self.blink_engine.stop_all()
+        self.fade_engine.stop_all()
+        self.scene_engine.stop()
         
-        self.green_led.off()
-        self.blue_led.off()
-        self.red_led.off()
-        self.buzzer.off()
-        self.led_states = {
-            'green': False,
-            'blue': False,
-            'red': False,
-            'buzzer': False,
-            'green_blink': False,
-            'blue_blink': False,
-            'red_blink': False
-        }
+        for led in self.leds.values():
+            led.off()
+        self.buzzer_player.stop()
+        self._update_states(**self._all_states(False, buzzer=False))
     
+    @timed(OPERATION_SECONDS, 'all_on')
+    @_locked
     def all_on(self):
-        # Stop all blinking
-        for color in ['green', 'blue', 'red']:
-            self.stop_blink_flags[color] = True
+        # Stop all blinking, fades and any scene
+        self.blink_engine.stop_all()
+        self.fade_engine.stop_all()
+        self.scene_engine.stop()
         
-        self.green_led.on()
-        self.blue_led.on()
-        self.red_led.on()
-        self.led_states['green'] = True
-        self.led_states['blue'] = True
-        self.led_states['red'] = True
-        self.led_states['green_blink'] = False
-        self.led_states['blue_blink'] = False
-        self.led_states['red_blink'] = False
+        for led in self.leds.values():
+            led.on()
+        self._update_states(**self._all_states(True))
+    
+    def scene_names(self):
+        return list(self.scenes)
+    
+    @_locked
+    def define_scene(self, name, definition):
+        """Compile and store a scene; raises ValueError if the definition is invalid"""
+        scene = compile_scene(name, definition, self.channels)
+        self.scenes[name] = scene
+        return scene
+    
+    @timed(OPERATION_SECONDS, 'play_scene')
+    @_locked
+    def play_scene(self, name, loops=None):
+        """Start a scene by name (KeyError if unknown), replacing any running one"""
+        scene = self.scenes[name]
+        if loops is not None:
+            scene = CompiledScene(scene.name, scene.channels, scene.frames, scene.period, loops)
+        with self.batch():
+            for channel in scene.channels:
+                self.blink_engine.stop(channel)
+                self.fade_engine.stop(channel)
+            leds = {channel: self.leds[channel] for channel in scene.channels}
+            playback = self.scene_engine.play(scene, leds, on_complete=self._on_scene_done)
+            # Animated channels are reported like blinking ones
+            changes = {}
+            for channel in scene.channels:
+                changes[channel] = False
+                changes[f'{channel}_blink'] = True
+                changes[f'{channel}_brightness'] = 0.0
+            self._update_states(**changes)
+        self._notify({'scene': playback.to_dict()})
+        return playback
+    
+    @timed(OPERATION_SECONDS, 'stop_scene')
+    @_locked
+    def stop_scene(self):
+        return self.scene_engine.stop()
+    
+    def get_scene(self):
+        """The running ScenePlayback, or None"""
+        return self.scene_engine.current()
+    
+    @_locked
+    def _on_scene_done(self, playback):
+        """Clear the flags of channels a finished or stopped scene drove"""
+        current = self.scene_engine.current()
+        changes = {}
+        for channel in playback.scene.channels:
+            if current is not None and channel in current.leds:
+                continue
+            if not self.blink_engine.is_blinking(channel) and self._current_states().get(f'{channel}_blink'):
+                changes[channel] = False
+                changes[f'{channel}_blink'] = False
+        self._update_states(**changes)
+        if current is None:
+            self._notify({'scene': None})
     
     def get_states(self):
-        return self.led_states
+        """Current states; the returned dict is read-only and never changes"""
+        return self._snapshot.states
+    
+    def get_snapshot(self):
+        """Current StateSnapshot(version, states), taken without locking"""
+        return self._snapshot
     
     def get_dht_reading(self):
-        """Read temperature and humidity from DHT11 sensor"""
-        try:
-            temperature = self.dht_sensor.temperature
-            humidity = self.dht_sensor.humidity
-            return {
-                'success': True,
-                'temperature': temperature,
-                'humidity': humidity
-            }
-        except RuntimeError as e:
-            # DHT sensors can occasionally fail to read
-            return {
-                'success': False,
-                'error': str(e)
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        """Latest temperature and humidity from the background sampler"""
+        return self.dht_sampler.get_reading()
+    
+    def get_dht_history(self, since=None, resolution=None):
+        """Temperature/humidity since a Unix time, as min/max/mean per bucket"""
+        return self.dht_history.query(since, resolution)
+    
+    def health(self):
+        """Per-device status; outputs are opened at startup, the sensor on first read"""
+        outputs = 'closed' if self._closed else 'ok'
+        return {
+            'backend': self.backend,
+            'leds': {channel: outputs for channel in self.leds},
+            'buzzer': outputs,
+            'dht': self.dht_sampler.health()
+        }
     
     def cleanup(self):
+        if self._closed:
+            return
+        self._closed = True
+        # Stop readings first so sample listeners cannot drive closed outputs
+        self._sample_listeners = []
+        self.dht_sampler.stop()
         self.all_off()
-        self.green_led.close()
-        self.blue_led.close()
-        self.red_led.close()
+        self.scheduler.stop()
+        for led in self.leds.values():
+            led.close()
         self.buzzer.close()
-        self.dht_sensor.exit()
+        self.pin_factory.close()
+        release_gpio_lock(self._gpio_lock)
 
 
 # For testing
@@ -316,19 +511,20 @@ if __name__ == "__main__":
     print("Testing LEDs...")
     
     print("Green LED ON")
-    controller.turn_on_green()
+    controller.set('green', True)
     time.sleep(1)
     
     print("Blue LED ON")
-    controller.turn_on_blue()
+    controller.set('blue', True)
     time.sleep(1)
     
     print("Red LED ON")
-    controller.turn_on_red()
+    controller.set('red', True)
     time.sleep(1)
     
     print("Buzzer test")
     controller.buzz(5)
+    time.sleep(5)
     
     print("All OFF")
     controller.all_off()
@@ -0,0 +1,156 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import counter
+
+ADMISSION_DECISIONS = counter('admission_decisions_total', 'Commands admitted, coalesced or rejected',
+                              ['result'])
+
+# Actions that set a channel's final state; bursts of them are coalesced
+COALESCED_ACTIONS = {'on', 'off', 'blink', 'brightness', 'fade'}
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, cost, now):
+        """Spend cost tokens; returns 0 on success, else seconds until they are available
+
+        A cost above burst is charged as a full bucket so it can still succeed.
+        """
+        cost = min(cost, self.burst)
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimited(Exception):
+    """Raised by AdmissionControl.check; retry_after is in seconds"""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f'Too many {scope} commands, retry in {retry_after:.2f} s')
+        self.scope = scope
+        self.retry_after = retry_after
+
+    def header(self):
+        """Retry-After header value (whole seconds, at least 1)"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class _Window:
+    """Commands for one channel waiting for its debounce window to close"""
+
+    def __init__(self, deadline, command):
+        self.deadline = deadline
+        self.command = command            # latest command; earlier ones are dropped
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AdmissionControl:
+    """Sits in front of the controller to keep bursts off the GPIO pins
+
+    check() charges a per-client and a per-channel token bucket. run()
+    debounces per channel: the first command runs at once, and commands
+    arriving within debounce seconds of it are held until the window closes,
+    when only the last one runs (last writer wins). Held requests all get the
+    final result. A rate of 0 turns the matching bucket off.
+    """
+
+    def __init__(self, client_rate=10.0, client_burst=20, channel_rate=20.0, channel_burst=40,
+                 debounce=0.05, max_clients=1024):
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.debounce = debounce
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()     # client -> TokenBucket, least recently seen first
+        self._channels = {}               # channel -> TokenBucket
+        self._last_run = {}               # channel -> time.monotonic() of the last command run
+        self._windows = {}                # channel -> open _Window
+
+    def check(self, client, channel=None, cost=1):
+        """Charge cost tokens to client and channel; raises RateLimited when out
+
+        client or channel may be None to charge only the other one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if client is not None and self.client_rate > 0:
+                bucket = self._clients.get(client)
+                if bucket is None:
+                    bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst, now)
+                    if len(self._clients) > self.max_clients:
+                        self._clients.popitem(last=False)
+                else:
+                    self._clients.move_to_end(client)
+                wait = bucket.take(cost, now)
+                if wait:
+                    ADMISSION_DECISIONS.inc('client_limited')
+                    raise RateLimited('client', wait)
+            if channel is not None and self.channel_rate > 0:
+                bucket = self._channels.get(channel)
+                if bucket is None:
+                    bucket = self._channels[channel] = TokenBucket(self.channel_rate, self.channel_burst, now)
+                wait = bucket.take(cost, now)
+                if wait:
+                    ADMISSION_DECISIONS.inc('channel_limited')
+                    raise RateLimited(channel, wait)
+
+    def run(self, channel, command):
+        """Run command() for channel, coalescing bursts; returns (result, coalesced)"""
+        if self.debounce <= 0:
+            ADMISSION_DECISIONS.inc('admitted')
+            return command(), False
+        with self._lock:
+            now = time.monotonic()
+            window = self._windows.get(channel)
+            if window is None and now - self._last_run.get(channel, float('-inf')) >= self.debounce:
+                self._last_run[channel] = now
+            elif window is None:
+                window = self._windows[channel] = _Window(self._last_run[channel] + self.debounce, command)
+            else:
+                window.command = command
+        if window is None:
+            ADMISSION_DECISIONS.inc('admitted')
+            return command(), False
+
+        # The request holding the latest command runs it when the window closes
+        time.sleep(max(window.deadline - time.monotonic(), 0))
+        with self._lock:
+            owner = window.command is command and self._windows.get(channel) is window
+            if owner:
+                del self._windows[channel]
+                self._last_run[channel] = time.monotonic()
+        if owner:
+            ADMISSION_DECISIONS.inc('admitted')
+            try:
+                window.result = command()
+            except Exception as e:
+                window.error = e
+                raise
+            finally:
+                window.done.set()
+            return window.result, False
+
+        ADMISSION_DECISIONS.inc('coalesced')
+        window.done.wait(self.debounce + 5.0)
+        if window.error is not None:
+            raise window.error
+        return window.result, True
@@ -1,17 +1,170 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request
+import atexit
+import math
+import os
+import re
 import threading
 import time
-import speech_recognition as sr
-from Leds import LEDController
+from Leds import DEFAULT_BUZZER_GPIO, DEFAULT_DHT_GPIO, LEDController
+from commands import CommandRegistry
+from devices import DeviceRegistry, LocalDevice, RemoteDevice, config_path, load_config
+from events import StateBroadcaster
+from protocol import JSON, MSGPACK, STATES, StateEncoder, available_formats
+from rules import RulesEngine
+from telemetry import TelemetryReader, TelemetryRecorder
+import metrics
+from admission import COALESCED_ACTIONS, AdmissionControl, RateLimited
+from assets import AssetServer
+from voice_listener import VoiceListener
+from voice_matcher import LRUCache, build_matchers
 
 app = Flask(__name__)
 
-# Initialize LED controller
-led_controller = LEDController()
+# LED controller, created once per process by create_app()
+led_controller = None
+
+# (device, action) -> handler table shared by the button, batch and voice paths
+command_registry = None
+
+# Rate limits and debouncing in front of the controller for button/API commands
+admission = None
+
+# Every board this dashboard drives, addressed as /api/<device>/<channel>/<action>
+device_registry = None
+
+# Push channel: controller changes are fanned out to /api/stream clients. Each
+# open stream holds a server thread, so streams are capped below the thread
+# pool (LED_THREADS, see gunicorn.conf.py) to keep threads free for requests
+MAX_STREAM_CLIENTS = int(os.environ.get('LED_MAX_STREAMS', int(os.environ.get('LED_THREADS', 32)) - 8))
+broadcaster = StateBroadcaster(max_clients=max(MAX_STREAM_CLIENTS, 1))
+
+# Append-only log of state changes and DHT readings; LED_TELEMETRY_DIR= (empty) disables it
+DEFAULT_TELEMETRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'telemetry')
+telemetry_recorder = None
+telemetry_reader = None
+
+# Prebuilt dashboard from `python assets.py`, served when LED_ASSETS_DIR is set;
+# otherwise the page is rendered from templates/ and static/ on each request
+asset_server = None
+
+# Cached per-version encodings of /api/states in every negotiable format
+state_encoder = None
+RESPONSE_FORMATS = available_formats()
+ETAG_SUFFIXES = {JSON: '', MSGPACK: '-msgpack', STATES: '-packed'}
+
+# DHT threshold rules run on the device; saved to LED_RULES_FILE
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+# One Vosk model directory per language, e.g. models/vosk/en-US
+DEFAULT_VOSK_MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'vosk')
+rules_engine = None
+
+_init_lock = threading.Lock()
+
+REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds',
+    'Time to produce a response, by route, method and status',
+    ['route', 'method', 'status']
+)
 
-# Voice recognition settings (optional - only needed if using Pi's microphone)
-recognizer = sr.Recognizer()
-microphone = None  # Not required - voice recognition uses browser's Web Speech API
+def create_app(backend=None):
+    """App factory for WSGI servers (see wsgi.py)
+
+    Builds the process-wide LEDController on first call and returns the app.
+    The controller holds the GPIO lock, so the server must run a single
+    process (worker) and get its concurrency from threads.
+    """
+    global led_controller, command_registry, telemetry_recorder, telemetry_reader, device_registry
+    global admission, rules_engine, asset_server, state_encoder
+    with _init_lock:
+        if led_controller is None:
+            # LED_DEVICES_CONFIG names a devices.json; without one this board is 'local'
+            path = config_path()
+            devices = load_config(path) if path else {'local': {'type': 'local'}}
+            local_name, local = next((name, device) for name, device in devices.items()
+                                     if device.get('type', 'local') == 'local')
+            controller = LEDController(
+                backend or local.get('backend'),
+                channels=local.get('channels'),
+                buzzer_gpio=local.get('buzzer', DEFAULT_BUZZER_GPIO),
+                dht_gpio=local.get('dht', DEFAULT_DHT_GPIO)
+            )
+            command_registry = CommandRegistry(controller)
+            # LED_CLIENT_RATE / LED_CHANNEL_RATE are commands per second (0 = unlimited)
+            client_rate = float(os.environ.get('LED_CLIENT_RATE', 10))
+            channel_rate = float(os.environ.get('LED_CHANNEL_RATE', 20))
+            admission = AdmissionControl(
+                client_rate, client_rate * 2, channel_rate, channel_rate * 2,
+                debounce=float(os.environ.get('LED_DEBOUNCE_MS', 50)) / 1000
+            )
+            device_registry = DeviceRegistry()
+            for name, device in devices.items():
+                if name == local_name:
+                    device_registry.add(LocalDevice(name, controller, command_registry,
+                                                    parse_command_options, admission))
+                else:
+                    device_registry.add(RemoteDevice(name, device['url'],
+                                                     float(device.get('timeout', 1.0))))
+            state_encoder = StateEncoder(controller.get_snapshot().states,
+                                         lambda payload: app.json.response(payload).get_data(),
+                                         boot=controller.boot_id)
+            if os.environ.get('LED_ASSETS_DIR'):
+                asset_server = AssetServer(os.environ['LED_ASSETS_DIR'])
+            controller.add_listener(broadcaster.publish)
+            rules_engine = RulesEngine(
+                os.environ.get('LED_RULES_FILE', DEFAULT_RULES_FILE),
+                validate_rule_action, run_rule_action,
+                on_change=lambda name, rule: broadcaster.publish({'rules': {name: {
+                    'active': rule['active'], 'last_fired': rule['last_fired']
+                }}})
+            )
+            rules_engine.load()
+            controller.add_sample_listener(rules_engine.on_sample)
+            telemetry_dir = os.environ.get('LED_TELEMETRY_DIR', DEFAULT_TELEMETRY_DIR)
+            if telemetry_dir:
+                with controller.lock:
+                    snapshot = controller.get_snapshot()
+                    # Only on/off flags fit the record's bitmask; brightness levels are not logged
+                    flags = [name for name, value in snapshot.states.items() if isinstance(value, bool)]
+                    telemetry_recorder = TelemetryRecorder(telemetry_dir, flags)
+                    telemetry_recorder.start(snapshot.states, snapshot.version)
+                    controller.add_listener(telemetry_recorder.record_changes)
+                telemetry_reader = TelemetryReader(telemetry_dir)
+            led_controller = controller
+            metrics.gauge('sse_clients', 'Connected /api/stream clients', broadcaster.client_count)
+            metrics.gauge('scheduler_pending_calls', 'Callbacks waiting on the timer thread',
+                          controller.scheduler.pending)
+            atexit.register(cleanup)
+            if os.environ.get('LED_VOICE_LISTENER') == '1':
+                # Open the microphone off the startup path
+                threading.Thread(target=get_voice_listener, name='voice-start', daemon=True).start()
+    return app
+
+# Voice recognition settings (optional - only needed if using Pi's microphone).
+# speech_recognition is imported by the first /api/listen call (or at startup
+# with LED_VOICE_LISTENER=1), not on import
+speech = None
+recognizer = None
+speech_error = None
+# Background microphone listener behind /api/listen, started by the first call
+voice_listener = None
+
+def load_speech_recognition():
+    """Import speech_recognition and build the recognizer on first use
+
+    Returns the module, or None if it cannot be loaded (the reason is kept in
+    speech_error and shown by /api/health).
+    """
+    global speech, recognizer, speech_error
+    with _init_lock:
+        if speech is None:
+            try:
+                import speech_recognition
+                recognizer = speech_recognition.Recognizer()
+            except Exception as e:
+                speech_error = str(e)
+            else:
+                speech, speech_error = speech_recognition, None
+    return speech
 
 # Current language setting (default: English)
 current_language = 'en-US'
@@ -32,6 +185,11 @@ COMMANDS = {
         'red_blink': ['blink red', 'flash red'],
         'all_blink': ['blink all', 'flash all'],
         'buzzer': ['buzzer', 'buzz', 'beep'],
+        'scene_chase': ['chase lights', 'chase mode', 'start chase'],
+        'scene_police': ['police lights', 'police mode', 'siren lights'],
+        'scene_heartbeat': ['heartbeat', 'heart beat'],
+        'scene_alert': ['alert mode', 'red alert'],
+        'scene_stop': ['stop scene', 'stop animation', 'stop the show'],
         'invalid_color_keywords': ['white', 'yellow', 'orange', 'purple', 'pink', 'black', 'brown', 'grey', 'gray', 'violet', 'cyan', 'magenta']
     },
     'fil-PH': {
@@ -48,126 +206,613 @@ COMMANDS = {
         'red_blink': ['i blink ang pulang ilaw', 'pakurap pulang ilaw'],
         'all_blink': ['i blink lahat', 'pakurap lahat'],
         'buzzer': ['buzzer', 'tunog', 'beep'],
+        'scene_chase': ['habulan ng ilaw', 'habulan'],
+        'scene_police': ['ilaw ng pulis', 'pulis'],
+        'scene_heartbeat': ['tibok ng puso'],
+        'scene_alert': ['alerto'],
+        'scene_stop': ['itigil ang eksena', 'tigil eksena'],
         'invalid_color_keywords': ['puti', 'dilaw', 'orange', 'lila', 'rosas', 'itim', 'kayumanggi', 'abo', 'violet']
     }
 }
 
+# Phrase matchers built once per language from COMMANDS
+voice_matchers = {}
+
+# Recent results keyed by (language, normalized text)
+voice_command_cache = LRUCache(maxsize=512)
+
+def reload_commands():
+    """Rebuild the phrase matchers after COMMANDS has been changed"""
+    global voice_matchers
+    # Swap in a complete new index so concurrent requests never see a partial one
+    voice_matchers = build_matchers(COMMANDS)
+    voice_command_cache.clear()
+
+reload_commands()
+
 def process_voice_command(text, language):
-    """Process voice command using hardcoded patterns"""
-    text = text.lower().strip()
-    commands = COMMANDS.get(language, COMMANDS['en-US'])
-    
-    # Check for valid LED commands
-    for action, phrases in commands.items():
-        if action in ['valid_colors', 'invalid_color_keywords']:
-            continue
-        for phrase in phrases:
-            if phrase in text:
-                return {'action': action, 'success': True, 'invalid_color': False}
+    """Process voice command using hardcoded patterns
+
+    The text is normalized (case, punctuation, filler words) and matched in one
+    pass; the longest command phrase wins and invalid colours only count when no
+    command phrase matched. Near misses are accepted by edit distance with a
+    confidence below 1.0. Results are cached per normalized utterance.
+    """
+    matcher = voice_matchers.get(language) or voice_matchers['en-US']
+    normalized = matcher.normalize(text)
+    key = (matcher.language, normalized)
     
-    # Check if user mentioned an invalid color
-    for invalid_color in commands.get('invalid_color_keywords', []):
-        if invalid_color in text:
-            return {'action': 'invalid_color', 'success': False, 'invalid_color': True, 'color': invalid_color}
+    result = voice_command_cache.get(key)
+    if result is None:
+        match = matcher.match(normalized)
+        if match is None:
+            result = {'action': 'unknown', 'success': False, 'invalid_color': False, 'confidence': 0.0}
+        elif match.action == 'invalid_color':
+            # User mentioned an invalid color
+            result = {'action': 'invalid_color', 'success': False, 'invalid_color': True,
+                      'color': match.phrase, 'confidence': match.confidence}
+        else:
+            result = {'action': match.action, 'success': True, 'invalid_color': False,
+                      'confidence': match.confidence}
+        voice_command_cache.put(key, result)
     
-    return {'action': 'unknown', 'success': False, 'invalid_color': False}
+    # Callers may add fields, so never hand out the cached dict itself
+    return dict(result)
 
 def execute_command(action):
     """Execute the LED/buzzer command"""
     result = {'success': True, 'states': {}} 
-
-    if action == 'green_on':
-        led_controller.turn_on_green()
-    elif action == 'green_off':
-        led_controller.turn_off_green()
-    elif action == 'blue_on':
-        led_controller.turn_on_blue()
-    elif action == 'blue_off':
-        led_controller.turn_off_blue()
-    elif action == 'red_on':
-        led_controller.turn_on_red()
-    elif action == 'red_off':
-        led_controller.turn_off_red()
-    elif action == 'all_on':
-        led_controller.all_on()
-    elif action == 'all_off':
-        led_controller.all_off()
-    elif action == 'green_blink':
-        led_controller.blink_green()
-    elif action == 'blue_blink':
-        led_controller.blink_blue()
-    elif action == 'red_blink':
-        led_controller.blink_red()
-    elif action == 'all_blink':
-        led_controller.blink_all()
-    elif action == 'buzzer':
-        led_controller.buzz(0.3)
-    else:
+    
+    command = command_registry.resolve_voice_action(action)
+    if command is None:
         result['success'] = False
+    else:
+        command_registry.dispatch(*command)
     
     result['states'] = led_controller.get_states()
     return result
 
+if metrics.ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            # The rule template, not the raw path, keeps the label set small
+            rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, rule, request.method,
+                                    str(response.status_code))
+        return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, controller, sensor and scheduler metrics for Prometheus"""
+    if not metrics.ENABLED:
+        return jsonify({'success': False, 'error': 'Metrics are disabled (LED_METRICS=0)'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def serve_asset(url):
+    """Answer from the prebuilt dashboard, picking gzip/br and honouring If-None-Match"""
+    answer = asset_server.respond(url, request.headers.get('Accept-Encoding'),
+                                  request.headers.get('If-None-Match'))
+    if answer is None:
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    status, headers, body = answer
+    return Response(body, status=status, headers=headers)
+
 @app.route('/')
 def index():
+    if asset_server is not None:
+        return serve_asset('/')
     return render_template('index.html')
 
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    """Fingerprinted CSS/JS from the build; cached by browsers for a year"""
+    if asset_server is None:
+        return jsonify({'success': False, 'error': 'No asset build loaded (LED_ASSETS_DIR)'}), 404
+    return serve_asset('/assets/' + filename)
+
+MAX_BATCH_OPERATIONS = 50
+
+def parse_blink_options(options):
+    """Read optional times/interval for a blink, raising ValueError if invalid"""
+    times = options.get('times')
+    times = int(times) if times is not None else None
+    interval = float(options.get('interval', 0.5))
+    if (times is not None and times < 1) or not 0.02 <= interval <= 10:
+        raise ValueError('times must be >= 1 and interval between 0.02 and 10 seconds')
+    return times, interval
+
+MAX_FADE_SECONDS = 60
+
+def parse_command_options(action, options):
+    """Handler keyword options for an action, raising ValueError if invalid"""
+    if action == 'blink':
+        times, interval = parse_blink_options(options)
+        return {'times': times, 'interval': interval}
+    if action in ('brightness', 'fade'):
+        level = float(options.get('level', 1.0 if action == 'brightness' else 0.0))
+        if not 0 <= level <= 1:
+            raise ValueError('level must be between 0 and 1')
+        if action == 'brightness':
+            return {'level': level}
+        duration = float(options.get('duration', 1.0))
+        if not 0 <= duration <= MAX_FADE_SECONDS:
+            raise ValueError(f'duration must be between 0 and {MAX_FADE_SECONDS} seconds')
+        return {'level': level, 'duration': duration}
+    return {}
+
+def response_format():
+    """Media type negotiated from the Accept header; JSON unless the client asks otherwise"""
+    return request.accept_mimetypes.best_match(RESPONSE_FORMATS) or JSON
+
+def compact_response(result, media_type):
+    """A command result in a compact format: packed states (job id in X-Job-Id) or msgpack"""
+    if media_type == STATES or set(result) <= {'success', 'states', 'version'}:
+        # Only the states matter: reuse the cached bytes of the current version
+        response = app.response_class(state_encoder.encode(led_controller.get_snapshot(), media_type),
+                                      mimetype=media_type)
+        jobs = result.get('jobs') or ([result['job']] if 'job' in result else [])
+        if jobs:
+            response.headers['X-Job-Id'] = ','.join(job['id'] for job in jobs)
+        if result.get('coalesced'):
+            response.headers['X-Coalesced'] = '1'
+    else:
+        response = app.response_class(state_encoder.encode_payload(result, media_type),
+                                      mimetype=media_type)
+    response.vary.add('Accept')
+    return response
+
+def rate_limited(error):
+    """429 response with a retry hint for a RateLimited error"""
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': round(error.retry_after, 3)})
+    response.headers['Retry-After'] = error.header()
+    return response, 429
+
 @app.route('/api/led/<led_name>/<action>', methods=['POST'])
 def control_led(led_name, action):
-    """Control LED via button click"""
+    """Control LED via button click
+
+    Blink accepts an optional JSON body {"times": n, "interval": s}; with times
+    set the blink runs in the background and the response carries its job.
+    Brightness takes {"level": 0-1} and fade {"level": 0-1, "duration": s}.
+    Commands on one channel within the debounce window collapse into the last
+    one ("coalesced": true); over the rate limits the answer is a 429.
+    """
+    known = command_registry.has(led_name, action)
     try:
-        if led_name == 'green':
-            if action == 'on':
-                led_controller.turn_on_green()
-            elif action == 'blink':
-                led_controller.blink_green()
-            else:
-                led_controller.turn_off_green()
-        elif led_name == 'blue':
-            if action == 'on':
-                led_controller.turn_on_blue()
-            elif action == 'blink':
-                led_controller.blink_blue()
-            else:
-                led_controller.turn_off_blue()
-        elif led_name == 'red':
-            if action == 'on':
-                led_controller.turn_on_red()
-            elif action == 'blink':
-                led_controller.blink_red()
-            else:
-                led_controller.turn_off_red()
-        elif led_name == 'buzzer':
-            led_controller.buzz(0.3)
-        elif led_name == 'all':
-            if action == 'on':
-                led_controller.all_on()
-            elif action == 'blink':
-                led_controller.blink_all()
-            else:
-                led_controller.all_off()
+        # Unknown names only cost the client, so they cannot grow the channel table
+        admission.check(request.remote_addr, led_name if known else None)
+    except RateLimited as e:
+        return rate_limited(e)
+    try:
+        if not known:
+            return jsonify({'success': False, 'error': f'Unknown command {led_name}/{action}'}), 404
+        options = parse_command_options(action, request.get_json(silent=True) or {})
         
-        return jsonify({
-            'success': True,
-            'states': led_controller.get_states()
-        })
+        def command():
+            job = command_registry.dispatch(led_name, action, **options)
+            result = {
+                'success': True,
+                'states': led_controller.get_states()
+            }
+            if job is not None:
+                result['job'] = job.to_dict()
+            return result
+        
+        if action not in COALESCED_ACTIONS:
+            result = command()
+        else:
+            result, coalesced = admission.run(led_name, command)
+            if coalesced:
+                result = dict(result, coalesced=True)
+        media_type = response_format()
+        if media_type != JSON:
+            return compact_response(result, media_type)
+        return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/states', methods=['GET'])
-def get_states():
-    """Get current LED states"""
-    return jsonify({
+@app.route('/api/devices', methods=['GET'])
+def list_devices():
+    """Every configured board with its channels, states and reachability"""
+    return jsonify({'success': True, 'devices': device_registry.describe()})
+
+@app.route('/api/<device>/<channel>/<action>', methods=['POST'])
+def control_device(device, channel, action):
+    """Run a command on a named board, or on every board at once with device 'all'
+
+    Takes the same JSON options as /api/led/<led_name>/<action>. Boards are
+    driven concurrently and each answers within its configured timeout. The
+    local board applies the same channel limits and debouncing as /api/led;
+    remote boards apply their own.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        admission.check(request.remote_addr, cost=len(device_registry.names()) if device == 'all' else 1)
+    except RateLimited as e:
+        return rate_limited(e)
+    if device == 'all':
+        results = device_registry.dispatch(device_registry.names(), channel, action, body)
+        # The HTTP status is per board here; drop it so results look like single-device replies
+        for result in results.values():
+            result.pop('status', None)
+        return jsonify({
+            'success': all(result.get('success') for result in results.values()),
+            'results': results
+        })
+    if device_registry.get(device) is None:
+        return jsonify({'success': False, 'error': f'Unknown device {device}'}), 404
+    result = device_registry.dispatch([device], channel, action, body)[device]
+    status = result.pop('status', 200)
+    response = jsonify(result)
+    if status == 429 and 'retry_after' in result:
+        response.headers['Retry-After'] = str(max(1, math.ceil(result['retry_after'])))
+    return response, status
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Apply an ordered list of LED/buzzer operations atomically
+
+    Body: {"operations": [{"led": "red", "action": "on"},
+                          {"led": "green", "action": "blink", "times": 3},
+                          {"led": "blue", "action": "fade", "level": 0.2, "duration": 2}]}
+    Every operation is validated before any is applied. Each operation is
+    charged to the client and to its channel's rate limit, but a batch is not
+    debounced: it runs atomically under one lock and publishes one snapshot,
+    so it cannot be split across debounce windows.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+    try:
+        # A batch costs one token per operation, so it cannot dodge the client limit
+        admission.check(request.remote_addr, cost=len(operations))
+    except RateLimited as e:
+        return rate_limited(e)
+    
+    parsed = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            return jsonify({'success': False, 'error': f'Operation {index} must be an object'}), 400
+        led_name = op.get('led')
+        action = op.get('action')
+        if not command_registry.has(led_name, action):
+            return jsonify({'success': False, 'error': f'Operation {index}: invalid {led_name}/{action}'}), 400
+        try:
+            options = parse_command_options(action, op)
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f'Operation {index}: {e}'}), 400
+        parsed.append((led_name, action, options))
+    
+    # Charge each channel for its operations once every operation is known to be valid
+    per_channel = {}
+    for led_name, _, _ in parsed:
+        per_channel[led_name] = per_channel.get(led_name, 0) + 1
+    try:
+        for led_name, count in per_channel.items():
+            admission.check(None, led_name, cost=count)
+    except RateLimited as e:
+        return rate_limited(e)
+    
+    jobs = []
+    with led_controller.lock:
+        with led_controller.batch():
+            for led_name, action, options in parsed:
+                job = command_registry.dispatch(led_name, action, **options)
+                if job is not None:
+                    jobs.append(job.to_dict())
+        snapshot = led_controller.get_snapshot()
+    
+    result = {
         'success': True,
+        'applied': len(parsed),
+        'version': snapshot.version,
+        'states': snapshot.states
+    }
+    if jobs:
+        result['jobs'] = jobs
+    media_type = response_format()
+    if media_type != JSON:
+        return compact_response(result, media_type)
+    return jsonify(result)
+
+def validate_rule_action(action):
+    """(device, action, options) for a rule action like {"device": "red", "action": "blink", "times": 3}"""
+    device, name = action.get('device'), action.get('action')
+    if not command_registry.has(device, name):
+        raise ValueError(f'Unknown command {device}/{name}')
+    return device, name, parse_command_options(name, action)
+
+def run_rule_action(action):
+    device, name, options = action
+    command_registry.dispatch(device, name, **options)
+
+@app.route('/api/rules', methods=['GET'])
+def list_rules():
+    """DHT rules with their current state"""
+    return jsonify({'success': True, 'rules': rules_engine.rules()})
+
+@app.route('/api/rules/<name>', methods=['GET'])
+def get_rule(name):
+    rule = rules_engine.get(name)
+    if rule is None:
+        return jsonify({'success': False, 'error': f'Unknown rule {name}'}), 404
+    return jsonify({'success': True, 'rule': rule})
+
+@app.route('/api/rules/<name>', methods=['PUT'])
+def define_rule(name):
+    """Add or replace a rule and save it
+
+    Body: {"metric": "temperature", "condition": {"above": 30, "clear_below": 28},
+           "actions": [{"device": "red", "action": "on"}, {"device": "buzzer", "action": "buzz"}],
+           "clear_actions": [{"device": "red", "action": "off"}], "cooldown": 300}
+    Conditions are above/clear_below, below/clear_above, or rising/falling by
+    an amount within "window" seconds.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    try:
+        rule = rules_engine.define(name, data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except OSError as e:
+        return jsonify({'success': False, 'error': f'Could not save rules: {e}'}), 500
+    return jsonify({'success': True, 'rule': rule.to_dict()})
+
+@app.route('/api/rules/<name>', methods=['DELETE'])
+def delete_rule(name):
+    try:
+        removed = rules_engine.remove(name)
+    except OSError as e:
+        return jsonify({'success': False, 'error': f'Could not save rules: {e}'}), 500
+    if not removed:
+        return jsonify({'success': False, 'error': f'Unknown rule {name}'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the progress of a fixed-count blink job"""
+    job = led_controller.get_blink_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/wait', methods=['GET'])
+def wait_job(job_id):
+    """Wait up to ?timeout= seconds (max 30) for a blink job to finish"""
+    job = led_controller.get_blink_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    timeout = min(request.args.get('timeout', 10.0, type=float), 30.0)
+    finished = job.wait(timeout)
+    return jsonify({'success': True, 'finished': finished, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a running blink job"""
+    job = led_controller.get_blink_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    cancelled = led_controller.cancel_blink_job(job_id)
+    return jsonify({
+        'success': cancelled,
+        'job': job.to_dict(),
         'states': led_controller.get_states()
     })
 
+SCENE_NAME = re.compile(r'^[a-z0-9_]{1,32}$')
+
+@app.route('/api/scenes', methods=['GET'])
+def list_scenes():
+    """Available scenes and the one playing, if any"""
+    playback = led_controller.get_scene()
+    return jsonify({
+        'success': True,
+        'scenes': {name: scene.to_dict() for name, scene in led_controller.scenes.items()},
+        'active': playback.to_dict() if playback is not None else None
+    })
+
+@app.route('/api/scenes/<name>', methods=['PUT'])
+def define_scene(name):
+    """Create or replace a scene
+
+    Body: {"steps": [{"on": ["red"], "duration": 0.2}, {"on": [], "duration": 0.2}],
+           "loops": 3}; loops omitted or null repeats until stopped.
+    """
+    if not SCENE_NAME.match(name) or name == 'stop':
+        return jsonify({'success': False, 'error': 'Scene names use a-z, 0-9 and _ (not "stop")'}), 400
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    try:
+        scene = led_controller.define_scene(name, data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    command_registry.register_scene(name)
+    return jsonify({'success': True, 'scene': scene.to_dict()})
+
+@app.route('/api/scenes/<name>/start', methods=['POST'])
+def start_scene(name):
+    """Start a scene; an optional {"loops": n} overrides its loop count"""
+    if name not in led_controller.scenes:
+        return jsonify({'success': False, 'error': f'Unknown scene {name}'}), 404
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    loops = data.get('loops')
+    try:
+        loops = int(loops) if loops is not None else None
+    except (TypeError, ValueError):
+        loops = 0
+    if loops is not None and loops < 1:
+        return jsonify({'success': False, 'error': 'loops must be >= 1'}), 400
+    playback = led_controller.play_scene(name, loops)
+    return jsonify({'success': True, 'scene': playback.to_dict(), 'states': led_controller.get_states()})
+
+@app.route('/api/scenes/stop', methods=['POST'])
+def stop_scene():
+    """Stop the running scene, leaving its LEDs off"""
+    stopped = led_controller.stop_scene()
+    return jsonify({'success': True, 'stopped': stopped, 'states': led_controller.get_states()})
+
+@app.route('/api/buzzer', methods=['GET'])
+def buzzer_status():
+    """Get buzzer playback status and queue depth"""
+    return jsonify({'success': True, 'buzzer': led_controller.get_buzzer_status()})
+
+# Server alerts (unrecognized colours) outrank anything an API client can queue
+ALERT_PRIORITY = 10
+MAX_PATTERN_STEPS = 32
+
+@app.route('/api/buzzer/pattern', methods=['POST'])
+def buzzer_pattern():
+    """Queue a beep pattern: {"pattern": [[on, gap], ...], "priority": 0}
+
+    At most MAX_PATTERN_STEPS steps; priority is clamped to 0..ALERT_PRIORITY - 1.
+    """
+    data = request.get_json() or {}
+    pattern = data.get('pattern', [])
+    try:
+        steps = [(float(on), float(gap)) for on, gap in pattern]
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid pattern'}), 400
+    if len(steps) > MAX_PATTERN_STEPS:
+        return jsonify({'success': False, 'error': f'At most {MAX_PATTERN_STEPS} steps per pattern'}), 400
+    priority = min(max(priority, 0), ALERT_PRIORITY - 1)
+    if any(on <= 0 or on > 5 or gap < 0 or gap > 5 for on, gap in steps):
+        return jsonify({'success': False, 'error': 'Step durations must be between 0 and 5 seconds'}), 400
+    
+    result = led_controller.buzz_pattern(steps, priority)
+    return jsonify({'success': result['accepted'], 'buzzer': result})
+
+@app.route('/api/states', methods=['GET'])
+def get_states():
+    """Get current LED states
+
+    The controller's boot id and snapshot version are sent as the ETag, so
+    clients repeating it in If-None-Match get an empty 304 until something
+    changes (or the server restarts). Accept:
+    application/msgpack or application/vnd.act7.states (see /api/states/schema)
+    selects a compact encoding; each is built once per version.
+    """
+    snapshot = led_controller.get_snapshot()
+    media_type = response_format()
+    etag = f'{led_controller.boot_id}-{snapshot.version}{ETAG_SUFFIXES[media_type]}'
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(state_encoder.encode(snapshot, media_type), mimetype=media_type)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/states/schema', methods=['GET'])
+def get_states_schema():
+    """Bit and byte order of the packed application/vnd.act7.states encoding"""
+    return jsonify(dict(state_encoder.schema(), success=True))
+
 @app.route('/api/dht', methods=['GET'])
 def get_dht():
     """Get DHT11 temperature and humidity reading"""
     reading = led_controller.get_dht_reading()
     return jsonify(reading)
 
+@app.route('/api/dht/history', methods=['GET'])
+def get_dht_history():
+    """Downsampled DHT11 history
+
+    ?since= is a Unix time (default: everything kept, up to a week) and
+    ?resolution= the bucket width in seconds; the server widens buckets to a
+    fixed step (1 s ... 1 day) so at most 500 are returned. Each series is column-oriented, one entry per bucket.
+    """
+    since = request.args.get('since', type=float)
+    resolution = request.args.get('resolution', type=float)
+    if resolution is not None and resolution <= 0:
+        return jsonify({'success': False, 'error': 'resolution must be positive'}), 400
+    history = led_controller.get_dht_history(since, resolution)
+    history['success'] = True
+    return jsonify(history)
+
+MAX_TELEMETRY_RECORDS = 5000
+
+@app.route('/api/telemetry', methods=['GET'])
+def get_telemetry():
+    """Logged state changes and DHT readings
+
+    ?since= and ?until= are Unix times, ?kind= is 'states' or 'dht' and
+    ?limit= caps the records returned (max 5000). Records still buffered in
+    memory are written out first (without an fsync) so the answer is up to date.
+    """
+    if telemetry_reader is None:
+        return jsonify({'success': False, 'error': 'Telemetry is disabled'}), 404
+    kind = request.args.get('kind')
+    if kind not in (None, 'states', 'dht'):
+        return jsonify({'success': False, 'error': 'kind must be states or dht'}), 400
+    limit = min(request.args.get('limit', MAX_TELEMETRY_RECORDS, type=int), MAX_TELEMETRY_RECORDS)
+    telemetry_recorder.flush(sync=False)
+    records = telemetry_reader.read(
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float),
+        kind=kind,
+        limit=max(limit, 1)
+    )
+    return jsonify({'success': True, 'records': records})
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """Server-Sent Events stream of LED, buzzer and sensor changes
+
+    Answers 503 once LED_MAX_STREAMS streams are open; the dashboard then
+    polls for a while before trying again.
+    """
+    subscription = broadcaster.subscribe()
+    if subscription is None:
+        response = jsonify({'success': False, 'error': 'Too many open streams, poll /api/states instead'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    snapshot = led_controller.get_snapshot()
+    initial = {
+        'states': snapshot.states,
+        'boot': led_controller.boot_id,
+        'version': snapshot.version,
+        'dht': led_controller.get_dht_reading()
+    }
+    response = Response(
+        broadcaster.stream(initial, subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also frees the slot if the client leaves before the first frame is sent
+    response.call_on_close(lambda: broadcaster.unsubscribe(subscription))
+    return response
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Per-device status, including devices that are opened on first use"""
+    devices = led_controller.health()
+    if voice_listener is not None:
+        devices['speech'] = voice_listener.health()
+    elif speech is not None:
+        devices['speech'] = {'status': 'ok'}
+    elif speech_error is not None:
+        devices['speech'] = {'status': 'unavailable', 'error': speech_error}
+    else:
+        devices['speech'] = {'status': 'not_loaded'}
+    return jsonify({'success': True, 'devices': devices})
+
 @app.route('/api/set_language', methods=['POST'])
 def set_language():
     """Set voice recognition language"""
@@ -186,117 +831,130 @@ def get_language():
     """Get current language"""
     return jsonify({'success': True, 'language': current_language})
 
-@app.route('/api/voice_command', methods=['POST'])
-def voice_command():
-    """Process voice command from browser Web Speech API"""
-    global current_language
-    data = request.get_json()
-    text = data.get('text', '')
-    language = data.get('language', current_language)
-    
-    if not text:
-        return jsonify({'success': False, 'error': 'No text provided', 'invalid_color': False})
-    
-    # Process the command
+def run_voice_command(text, language):
+    """Match a recognized phrase and run it; returns the response payload"""
     command_result = process_voice_command(text, language)
     
-    # Ensure invalid_color field exists
-    if 'invalid_color' not in command_result:
-        command_result['invalid_color'] = False
-    
     if command_result.get('invalid_color', False):
-        # Trigger buzzer for invalid color
-        led_controller.buzz(0.5)
-        return jsonify({
+        # Trigger buzzer for invalid color; alerts jump ahead of button beeps
+        led_controller.buzz(0.5, priority=ALERT_PRIORITY)
+        return {
             'success': False,
             'invalid_color': True,
             'color': command_result.get('color', 'unknown'),
             'message': f"Invalid color: {command_result.get('color', 'unknown')}. Only White, Blue, and Red LEDs are available!",
             'states': led_controller.get_states()
-        })
+        }
     
     if command_result.get('success', False):
         exec_result = execute_command(command_result['action'])
-        return jsonify({
+        return {
             'success': True,
             'action': command_result['action'],
+            'confidence': command_result['confidence'],
             'invalid_color': False,
             'states': exec_result['states']
-        })
+        }
     
-    return jsonify({
+    return {
         'success': False,
         'error': 'Command not recognized',
         'invalid_color': False,
         'text': text,
         'states': led_controller.get_states()
-    })
+    }
 
-@app.route('/api/listen', methods=['POST'])
-def listen_voice():
-    """Listen for voice command using server-side speech recognition (backup)"""
-    global current_language
-    data = request.get_json() or {}
+@app.route('/api/voice_command', methods=['POST'])
+def voice_command():
+    """Process voice command from browser Web Speech API"""
+    data = request.get_json()
+    text = data.get('text', '')
     language = data.get('language', current_language)
     
+    if not text:
+        return jsonify({'success': False, 'error': 'No text provided', 'invalid_color': False})
+    
+    return jsonify(run_voice_command(text, language))
+
+def get_voice_listener():
+    """Open the microphone and start the background listener on first use
+
+    Returns None if speech recognition or the microphone is unavailable (the
+    reason is kept in speech_error).
+    """
+    global voice_listener, speech_error
+    sr = load_speech_recognition()
+    if sr is None:
+        return None
+    vosk_dir = os.environ.get('LED_VOSK_MODELS', DEFAULT_VOSK_MODELS)
+    with _init_lock:
+        if voice_listener is None:
+            listener = VoiceListener(
+                sr, recognizer, run_voice_command, lambda: current_language,
+                engine=os.environ.get('LED_SPEECH_ENGINE', 'vosk'),
+                vosk_models={language: os.path.join(vosk_dir, language) for language in COMMANDS}
+            )
+            try:
+                listener.start()
+            except Exception as e:
+                speech_error = f'Listener unavailable: {e}'
+                return None
+            voice_listener = listener
+    return voice_listener
+
+MAX_LISTEN_SECONDS = 30
+
+@app.route('/api/listen', methods=['POST'])
+def listen_voice():
+    """Ask the server-side listener for the next voice command (backup)
+
+    Returns a job at once; poll /api/listen/<job_id> for the recognized text
+    and the command result. Optional JSON body {"language": ..., "timeout": s}.
+    """
+    data = request.get_json(silent=True) or {}
+    listener = get_voice_listener()
+    if listener is None:
+        return jsonify({'success': False, 'error': f'Speech recognition unavailable: {speech_error}'}), 503
     try:
-        with microphone as source:
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            print("Listening...")
-            audio = recognizer.listen(source, timeout=5, phrase_time_limit=5)
-        
-        # Recognize speech
-        text = recognizer.recognize_google(audio, language=language)
-        print(f"Recognized: {text}")
-        
-        # Process command
-        command_result = process_voice_command(text, language)
-        
-        if command_result['invalid_color']:
-            led_controller.buzz(0.5)
-            return jsonify({
-                'success': False,
-                'invalid_color': True,
-                'color': command_result.get('color', 'unknown'),
-                'message': f"Invalid color: {command_result.get('color', 'unknown')}. Only White, Blue, and Red LEDs are available!",
-                'text': text,
-                'states': led_controller.get_states()
-            })
-        
-        if command_result['success']:
-            exec_result = execute_command(command_result['action'])
-            return jsonify({
-                'success': True,
-                'action': command_result['action'],
-                'text': text,
-                'states': exec_result['states']
-            })
-        
-        return jsonify({
-            'success': False,
-            'error': 'Command not recognized',
-            'text': text,
-            'states': led_controller.get_states()
-        })
-        
-    except sr.WaitTimeoutError:
-        return jsonify({'success': False, 'error': 'No speech detected. Please try again.'})
-    except sr.UnknownValueError:
-        return jsonify({'success': False, 'error': 'Could not understand audio. Please try again.'})
-    except sr.RequestError as e:
-        return jsonify({'success': False, 'error': f'Speech service error: {str(e)}'})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        timeout = float(data.get('timeout', 10.0))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'timeout must be a number'}), 400
+    timeout = min(max(timeout, 1.0), MAX_LISTEN_SECONDS)
+    try:
+        job = listener.submit(data.get('language', current_language), timeout)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+@app.route('/api/listen/<job_id>', methods=['GET'])
+def get_listen_job(job_id):
+    """Poll a listen job; ?wait= holds the request up to that many seconds (max 30)"""
+    job = voice_listener.get(job_id) if voice_listener is not None else None
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    wait = min(request.args.get('wait', 0.0, type=float), float(MAX_LISTEN_SECONDS))
+    if wait > 0 and not job.done():
+        job.wait(max(min(wait, job.deadline - time.monotonic()), 0))
+        voice_listener.get(job_id)        # marks the job timed out if it expired meanwhile
+    return jsonify({'success': True, 'finished': job.done(), 'job': job.to_dict()})
 
 def cleanup():
     """Cleanup GPIO on exit"""
-    led_controller.cleanup()
-
-import atexit
-atexit.register(cleanup)
+    if voice_listener is not None:
+        voice_listener.stop()
+    if device_registry is not None:
+        device_registry.close()
+    if led_controller is not None:
+        led_controller.cleanup()
+    if telemetry_recorder is not None:
+        # After the controller, so its final all-off is logged too
+        telemetry_recorder.close()
 
 if __name__ == '__main__':
+    # Development server; use `./run.sh prod` (gunicorn) for production
+    create_app()
     print("Starting Voice-Controlled LED Server...")
     print("Access the web interface at http://<your-pi-ip>:5000")
     # Use use_reloader=False to prevent GPIO conflicts on restart
-    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True, use_reloader=False)
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    app.run(host='0.0.0.0', port=5000, debug=debug, threaded=True, use_reloader=False)
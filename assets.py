@@ -0,0 +1,186 @@
+"""Dashboard asset pipeline
+
+    python assets.py [--output build]
+
+renders templates/index.html once, copies static/ files under content-hash
+names and writes gzip (and brotli, if the brotli package is installed)
+variants next to them, plus a manifest.json. With LED_ASSETS_DIR pointing at
+the output, the app serves the page and assets from memory: hashed files are
+cached forever by browsers, the page itself is revalidated with its ETag.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(REPO_ROOT, 'static')
+TEMPLATE_DIR = os.path.join(REPO_ROOT, 'templates')
+PAGES = ('index.html',)
+
+# URL prefix for fingerprinted files; /static stays available for development
+ASSET_PREFIX = '/assets/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Preferred first; extension of the precompressed variant on disk
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _compress(data):
+    """Precompressed variants smaller than data, as {encoding: bytes}"""
+    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def _write(output, relative, data):
+    path = os.path.join(output, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_variants(output, relative, data):
+    """Write data and its compressed variants; returns the encodings written"""
+    _write(output, relative, data)
+    variants = _compress(data)
+    for encoding, suffix in ENCODINGS:
+        if encoding in variants:
+            _write(output, relative + suffix, variants[encoding])
+    return sorted(variants)
+
+
+def build(output):
+    """Build the dashboard into output and return the manifest"""
+    from jinja2 import Environment, FileSystemLoader
+
+    manifest = {'static': {}, 'files': {}}
+    for directory, _, names in os.walk(STATIC_DIR):
+        for name in sorted(names):
+            source = os.path.join(directory, name)
+            logical = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            digest = _digest(data)
+            stem, extension = os.path.splitext(logical)
+            hashed = f'{stem}.{digest}{extension}'
+            manifest['static'][logical] = ASSET_PREFIX + hashed
+            manifest['files'][ASSET_PREFIX + hashed] = {
+                'path': 'assets/' + hashed,
+                'etag': digest,
+                'cache': IMMUTABLE,
+                'encodings': _write_variants(output, 'assets/' + hashed, data)
+            }
+
+    def url_for(endpoint, filename=None, **values):
+        if endpoint != 'static':
+            raise ValueError(f'Pages can only link static files, not {endpoint}')
+        return manifest['static'][filename]
+
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
+    environment.globals['url_for'] = url_for
+    for page in PAGES:
+        data = environment.get_template(page).render().encode()
+        manifest['files']['/' if page == 'index.html' else '/' + page] = {
+            'path': 'pages/' + page,
+            'etag': _digest(data),
+            'cache': REVALIDATE,
+            'encodings': _write_variants(output, 'pages/' + page, data)
+        }
+
+    with open(os.path.join(output, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _accepted(accept_encoding):
+    """Encodings the client accepts (q > 0) from an Accept-Encoding header"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class Asset:
+    """One built file and its precompressed bodies, held in memory"""
+
+    def __init__(self, etag, cache, content_type, bodies):
+        self.etag = etag
+        self.cache = cache
+        self.content_type = content_type
+        self.bodies = bodies              # encoding ('identity', 'gzip', 'br') -> bytes
+
+
+class AssetServer:
+    """Serves a build from memory with content negotiation and ETags"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assets = {}
+        for url, entry in manifest['files'].items():
+            path = os.path.join(directory, entry['path'])
+            bodies = {}
+            with open(path, 'rb') as f:
+                bodies['identity'] = f.read()
+            for encoding, suffix in ENCODINGS:
+                if encoding in entry['encodings']:
+                    with open(path + suffix, 'rb') as f:
+                        bodies[encoding] = f.read()
+            content_type = mimetypes.guess_type(entry['path'])[0] or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type.endswith('javascript'):
+                content_type += '; charset=utf-8'
+            self.assets[url] = Asset(entry['etag'], entry['cache'], content_type, bodies)
+
+    def respond(self, url, accept_encoding=None, if_none_match=None):
+        """(status, headers, body) for url, or None if the build has no such file"""
+        asset = self.assets.get(url)
+        if asset is None:
+            return None
+        accepted = _accepted(accept_encoding)
+        encoding = next((name for name, _ in ENCODINGS if name in asset.bodies and name in accepted),
+                        'identity')
+        # One tag per encoding; any of them means the client already has this content
+        etag = f'"{asset.etag}-{encoding}"' if encoding != 'identity' else f'"{asset.etag}"'
+        headers = {'ETag': etag, 'Cache-Control': asset.cache, 'Vary': 'Accept-Encoding'}
+        if if_none_match and (if_none_match.strip() == '*' or
+                              f'"{asset.etag}' in if_none_match):
+            return 304, headers, b''
+        headers['Content-Type'] = asset.content_type
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, asset.bodies[encoding]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the dashboard for LED_ASSETS_DIR')
+    parser.add_argument('--output', default=os.path.join(REPO_ROOT, 'build'))
+    args = parser.parse_args()
+    manifest = build(args.output)
+    for url, entry in sorted(manifest['files'].items()):
+        print(f"{url}  ({', '.join(entry['encodings']) or 'uncompressed'})")
+    print(f'Built into {args.output}; start the server with LED_ASSETS_DIR={args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import fcntl
+import os
+import random
+import threading
+import time
+
+# Selected with LEDController(backend=...) or the LED_BACKEND environment variable
+BACKENDS = ('lgpio', 'mock')
+DEFAULT_BACKEND = 'lgpio'
+
+
+def resolve_backend(name=None):
+    name = (name or os.environ.get('LED_BACKEND') or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown pin backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return name
+
+
+# Lock file that makes sure only one process drives the real pins
+DEFAULT_GPIO_LOCK = '/tmp/act7-gpio.lock'
+
+
+def acquire_gpio_lock(path=None):
+    """Take an exclusive lock on the GPIO lock file and return its descriptor
+
+    Raises RuntimeError if another process (e.g. a second server worker)
+    already owns the pins. The lock is released when the descriptor is closed
+    or the process exits.
+    """
+    path = path or os.environ.get('LED_GPIO_LOCK', DEFAULT_GPIO_LOCK)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        owner = os.read(fd, 32).decode(errors='replace').strip() or 'unknown'
+        os.close(fd)
+        raise RuntimeError(f'GPIO pins are already owned by process {owner} ({path})')
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
+
+
+def release_gpio_lock(fd):
+    if fd is not None:
+        os.close(fd)
+
+
+def create_pin_factory(backend):
+    """gpiozero pin factory for a backend; imports only what that backend needs"""
+    if backend == 'mock':
+        from gpiozero.pins.mock import MockFactory, MockPWMPin
+        # PWM-capable mock pins so every output type can be simulated
+        return MockFactory(pin_class=MockPWMPin)
+    from gpiozero.pins.lgpio import LGPIOFactory
+    # lgpio for Raspberry Pi 5 / newer OS
+    return LGPIOFactory()
+
+
+def create_dht_sensor(backend, gpio):
+    """DHT11 driver for a backend; the simulator is tuned with LED_DHT_* variables"""
+    if backend == 'mock':
+        return SimulatedDHT11(
+            latency=float(os.environ.get('LED_DHT_LATENCY', 0.25)),
+            failure_rate=float(os.environ.get('LED_DHT_FAILURE_RATE', 0.2))
+        )
+    import adafruit_dht
+    import board
+    return adafruit_dht.DHT11(getattr(board, f'D{gpio}'))
+
+
+class SimulatedDHT11:
+    """Stand-in for adafruit_dht.DHT11 with configurable read latency and failure rate
+
+    Like the real driver, reading temperature performs a (slow, fallible) sensor
+    transaction and humidity returns the value captured by that same read.
+    """
+
+    def __init__(self, latency=0.25, failure_rate=0.2, temperature=25.0, humidity=55.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._temperature = temperature
+        self._humidity = humidity
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _measure(self):
+        with self._lock:
+            if self.latency:
+                time.sleep(self.latency)
+            if self._random.random() < self.failure_rate:
+                raise RuntimeError('Checksum did not validate. Try again.')
+            # Slow random walk so readings look like a real room
+            self._temperature = round(min(max(self._temperature + self._random.uniform(-0.3, 0.3), 10), 40), 1)
+            self._humidity = round(min(max(self._humidity + self._random.uniform(-1, 1), 20), 90), 1)
+            return self._temperature
+
+    @property
+    def temperature(self):
+        return self._measure()
+
+    @property
+    def humidity(self):
+        return self._humidity
+
+    def exit(self):
+        pass
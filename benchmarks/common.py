@@ -0,0 +1,68 @@
+"""Helpers shared by the benchmark scripts"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Benchmarks never touch real pins unless asked to
+os.environ.setdefault('LED_BACKEND', 'mock')
+os.environ.setdefault('LED_DHT_LATENCY', '0.01')
+# Load generators hammer one channel from one client; measure the server, not the limiter
+os.environ.setdefault('LED_CLIENT_RATE', '0')
+os.environ.setdefault('LED_CHANNEL_RATE', '0')
+os.environ.setdefault('LED_DEBOUNCE_MS', '0')
+# Keep benchmark telemetry out of the repository
+os.environ.setdefault('LED_TELEMETRY_DIR', tempfile.mkdtemp(prefix='act7-telemetry-'))
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_samples) - 1))), len(sorted_samples) - 1)
+    return sorted_samples[index]
+
+
+def summarize(samples, wall_time):
+    """Latency percentiles (microseconds) and throughput for per-call timings in seconds"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        'count': count,
+        'p50_us': round(percentile(ordered, 0.50) * 1e6, 2),
+        'p99_us': round(percentile(ordered, 0.99) * 1e6, 2),
+        'max_us': round(ordered[-1] * 1e6, 2) if ordered else 0.0,
+        'mean_us': round(sum(ordered) / count * 1e6, 2) if count else 0.0,
+        'ops_per_sec': round(count / wall_time, 1) if wall_time else 0.0
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'backend': os.environ.get('LED_BACKEND'),
+        'commit': commit
+    }
+
+
+def write_report(report, output=None):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
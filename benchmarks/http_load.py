@@ -0,0 +1,125 @@
+"""Concurrent HTTP load generator for the Flask API
+
+By default the app is served in-process on the simulated pin backend; pass
+--url to load-test a running server (e.g. the real Pi) instead.
+
+Usage: python benchmarks/http_load.py [--concurrency 8] [--duration 5]
+                                      [--url http://pi:5000] [--output report.json]
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from common import environment, summarize, write_report
+
+# name -> list of (method, path, json body) cycled through by every client
+SCENARIOS = {
+    'led_control': [
+        ('POST', '/api/led/green/on', None),
+        ('POST', '/api/led/green/off', None),
+        ('POST', '/api/led/red/blink', None),
+        ('POST', '/api/led/red/off', None)
+    ],
+    'states': [('GET', '/api/states', None)],
+    'dht': [('GET', '/api/dht', None)],
+    'voice_command': [
+        ('POST', '/api/voice_command', {'text': 'turn on the blue light', 'language': 'en-US'}),
+        ('POST', '/api/voice_command', {'text': 'blue off', 'language': 'en-US'}),
+        ('POST', '/api/voice_command', {'text': 'pakibuksan po ang pulang ilaw', 'language': 'fil-PH'})
+    ]
+}
+
+
+def start_local_server():
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app
+
+    # Keep-alive so the generator measures the app rather than TCP setup
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    server = make_server('127.0.0.1', 0, app.create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def run_client(host, port, requests, deadline, samples, errors):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    index = 0
+    while time.perf_counter() < deadline:
+        method, path, body = requests[index % len(requests)]
+        index += 1
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        t0 = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        samples.append(time.perf_counter() - t0)
+    connection.close()
+
+
+def run_scenario(base_url, requests, concurrency, duration):
+    parts = urlsplit(base_url)
+    samples, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    clients = [
+        threading.Thread(target=run_client,
+                         args=(parts.hostname, parts.port or 80, requests, deadline, samples, errors))
+        for _ in range(concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    result = summarize(samples, time.perf_counter() - start)
+    result['errors'] = len(errors)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='target an already running server')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per scenario')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='run only these scenarios (repeatable)')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, base_url = start_local_server()
+
+    results = {}
+    try:
+        for name in args.scenario or SCENARIOS:
+            results[name] = run_scenario(base_url, SCENARIOS[name], args.concurrency, args.duration)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    write_report({
+        'benchmark': 'http_load',
+        'environment': environment(),
+        'target': args.url or 'in-process',
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'results': results
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Micro-benchmarks for the controller and voice-command hot paths
+
+Usage: python benchmarks/micro.py [--iterations N] [--output report.json]
+"""
+import argparse
+import time
+
+from common import environment, summarize, write_report
+
+
+def measure(func, iterations):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start)
+
+
+def synthetic_commands(phrase_count):
+    """A command table with phrase_count phrases spread over 20 actions"""
+    commands = {f'action_{i}': [] for i in range(20)}
+    for i in range(phrase_count):
+        commands[f'action_{i % 20}'].append(f'synthetic phrase number {i} for action {i % 20}')
+    commands['invalid_color_keywords'] = ['white', 'yellow', 'orange']
+    return commands
+
+
+def bench_phrase_scaling(iterations):
+    from voice_matcher import CommandMatcher
+    results = {}
+    for phrase_count in (50, 200, 800, 3200):
+        matcher = CommandMatcher(synthetic_commands(phrase_count), 'en-US')
+        last = phrase_count - 1
+        exact = matcher.normalize(f'please run synthetic phrase number {last} for action {last % 20} now')
+        miss = matcher.normalize('this sentence matches no command at all')
+        results[str(phrase_count)] = {
+            'exact_hit': measure(lambda: matcher.match(exact), iterations),
+            'no_match': measure(lambda: matcher.match(miss), max(iterations // 10, 1))
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    n = args.iterations
+
+    import app
+    app.create_app()
+    controller = app.led_controller
+    texts = ['turn on the green light', 'blink all', 'tern off red', 'make it purple', 'what time is it']
+
+    def voice_uncached():
+        app.voice_command_cache.clear()
+        for text in texts:
+            app.process_voice_command(text, 'en-US')
+
+    def voice_cached():
+        for text in texts:
+            app.process_voice_command(text, 'en-US')
+
+    actions = ['green_on', 'green_off', 'red_on', 'red_off', 'all_on', 'all_off']
+
+    def execute():
+        for action in actions:
+            app.execute_command(action)
+
+    report = {
+        'benchmark': 'micro',
+        'environment': environment(),
+        'iterations': n,
+        'results': {
+            'process_voice_command_uncached_x5': measure(voice_uncached, n // 5),
+            'process_voice_command_cached_x5': measure(voice_cached, n),
+            'execute_command_x6': measure(execute, n // 5),
+            'get_states': measure(controller.get_states, n * 10),
+            'get_dht_reading': measure(controller.get_dht_reading, n * 10),
+            'phrase_scaling': bench_phrase_scaling(n // 5)
+        }
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Cold-start profile: import time, controller start-up and first response
+
+Each run uses a fresh interpreter, like a restart after a crash.
+
+Usage: python benchmarks/startup.py [--runs N] [--importtime] [--output report.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import REPO_ROOT, environment, write_report
+
+# Runs in the child interpreter and prints one JSON line of timings (seconds)
+PROBE = '''
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+response = app.app.test_client().get('/api/states')
+t3 = time.perf_counter()
+assert response.status_code == 200
+app.cleanup()
+print(json.dumps({'import_app': t1 - t0, 'create_app': t2 - t1,
+                  'first_request': t3 - t2, 'total': t3 - t0}))
+'''
+
+
+def run_probe():
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=REPO_ROOT, env=dict(os.environ),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit=15):
+    """Top modules by cumulative import time, from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=REPO_ROOT,
+        env=dict(os.environ), capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), module.rstrip()))
+    rows.sort(reverse=True)
+    return [{'module': module.strip(), 'cumulative_ms': round(us / 1000, 2),
+             'depth': (len(module) - len(module.lstrip())) // 2}
+            for us, module in rows[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', action='store_true',
+                        help='also list the slowest imports of app.py')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    runs = [run_probe() for _ in range(args.runs)]
+    results = {}
+    for phase in runs[0]:
+        values = sorted(run[phase] for run in runs)
+        results[phase] = {
+            'min_ms': round(values[0] * 1000, 2),
+            'median_ms': round(values[len(values) // 2] * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2)
+        }
+
+    report = {'environment': environment(), 'runs': args.runs, 'results': results}
+    if args.importtime:
+        report['slowest_imports'] = slowest_imports()
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from metrics import counter
+
+BLINKS_STARTED = counter('blinks_started_total', 'Blinks started, by kind', ['kind'])
+
+
+def _set(led, on):
+    if on:
+        led.on()
+    else:
+        led.off()
+
+
+class BlinkJob:
+    """Handle for a fixed-count blink running in the background"""
+
+    def __init__(self, channels, times, interval):
+        self.id = uuid.uuid4().hex[:12]
+        self.channels = list(channels)
+        self.times = times
+        self.interval = interval
+        self.cycles_done = 0
+        self.status = 'running'           # running | done | cancelled
+        self.on_complete = None
+        self._done = threading.Event()
+        self._engine = None
+        self._group = None                # the BlinkGroup running this job
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        return self._engine.cancel_job(self.id)
+
+    def _finish(self, status):
+        self.status = status
+        self._done.set()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'channels': self.channels,
+            'times': self.times,
+            'interval': self.interval,
+            'cycles_done': self.cycles_done,
+            'status': self.status
+        }
+
+
+class BlinkGroup:
+    """Channels blinking together at one interval, toggled in the same tick"""
+
+    def __init__(self, interval, start_time, job=None):
+        self.interval = interval
+        self.start_time = start_time
+        self.job = job                    # set for fixed-count blinks
+        self.tick = 0
+        self.leds = {}                    # channel -> gpiozero output
+        self.call = None
+
+    def phase_on(self):
+        return self.tick % 2 == 0
+
+
+class BlinkEngine:
+    """Owns every blinking output and drives them from one scheduler"""
+
+    def __init__(self, scheduler, job_history=64):
+        self.scheduler = scheduler
+        self.job_history = job_history
+        self._lock = threading.Lock()
+        self._groups = []
+        self._channel_group = {}          # channel -> BlinkGroup
+        self._jobs = OrderedDict()        # job id -> BlinkJob, oldest first
+
+    def blink(self, channel, led, interval=0.5, times=None, on_complete=None):
+        """Blink one channel; see blink_many"""
+        return self.blink_many({channel: led}, interval, times, on_complete)
+
+    def blink_many(self, leds, interval=0.5, times=None, on_complete=None):
+        """Start blinking channels together
+
+        Continuous blinks (times=None) are phase-locked with any channels already
+        blinking at the same interval. Fixed-count blinks get their own group and
+        return a BlinkJob; on_complete(job) runs once it finishes or is cancelled
+        through cancel_job().
+        """
+        with self._lock:
+            for channel in leds:
+                self._detach(channel)
+
+            BLINKS_STARTED.inc('continuous' if times is None else 'fixed')
+            if times is not None:
+                times = max(int(times), 1)
+                job = BlinkJob(leds, times, interval)
+                job._engine = self
+                job.on_complete = on_complete
+                self._remember(job)
+                group = BlinkGroup(interval, time.monotonic(), job)
+                job._group = group
+                self._start_group(group, leds)
+                return job
+
+            group = next((g for g in self._groups
+                          if g.job is None and g.interval == interval), None)
+            if group is None:
+                self._start_group(BlinkGroup(interval, time.monotonic()), leds)
+            else:
+                # Join the running group at its current phase; tick has already
+                # advanced past the last toggle, so the LEDs show the opposite
+                self._attach(group, leds)
+                for led in leds.values():
+                    _set(led, not group.phase_on())
+            return None
+
+    def stop(self, channel):
+        """Stop blinking a channel; no further toggles happen once this returns"""
+        with self._lock:
+            return self._detach(channel)
+
+    def stop_all(self):
+        with self._lock:
+            for channel in list(self._channel_group):
+                self._detach(channel)
+
+    def is_blinking(self, channel):
+        with self._lock:
+            return channel in self._channel_group
+
+    def channels(self):
+        with self._lock:
+            return list(self._channel_group)
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel_job(self, job_id):
+        """Stop a fixed-count blink early, leaving its LEDs off"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done():
+                return False
+            # Channels may have been taken over since; only the job's own group counts
+            group = job._group
+            if group not in self._groups:
+                return False
+            for led in group.leds.values():
+                led.off()
+            self._remove_group(group, 'cancelled')
+        if job.on_complete is not None:
+            job.on_complete(job)
+        return True
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        # Forget the oldest finished jobs once the history is full
+        for old_id in list(self._jobs):
+            if len(self._jobs) <= self.job_history:
+                break
+            if self._jobs[old_id].done():
+                del self._jobs[old_id]
+
+    def _start_group(self, group, leds):
+        self._groups.append(group)
+        self._attach(group, leds)
+        self._toggle_locked(group)
+
+    def _attach(self, group, leds):
+        group.leds.update(leds)
+        for channel in leds:
+            self._channel_group[channel] = group
+
+    def _detach(self, channel):
+        group = self._channel_group.pop(channel, None)
+        if group is None:
+            return False
+        group.leds.pop(channel, None)
+        if not group.leds:
+            self._remove_group(group, 'cancelled')
+        return True
+
+    def _remove_group(self, group, status):
+        if group.call is not None:
+            group.call.cancel()
+        self._groups.remove(group)
+        for channel in group.leds:
+            self._channel_group.pop(channel, None)
+        if group.job is not None and not group.job.done():
+            group.job._finish(status)
+
+    def _toggle(self, group):
+        finished = None
+        with self._lock:
+            if group not in self._groups:
+                return
+            finished = self._toggle_locked(group)
+        # Completion callbacks run outside the lock so they can call back in
+        if finished is not None and finished.on_complete is not None:
+            finished.on_complete(finished)
+
+    def _toggle_locked(self, group):
+        on = group.phase_on()
+        for led in group.leds.values():
+            _set(led, on)
+        group.tick += 1
+
+        job = group.job
+        if job is not None:
+            if not on:
+                job.cycles_done += 1
+            if job.cycles_done >= job.times:
+                self._remove_group(group, 'done')
+                return job
+        else:
+            # Skip ticks missed while the scheduler was busy, keeping the phase
+            behind = int((time.monotonic() - group.start_time) / group.interval) + 1 - group.tick
+            if behind > 0:
+                group.tick += behind - behind % 2
+
+        # Absolute deadlines keep the phase from drifting
+        deadline = group.start_time + group.tick * group.interval
+        group.call = self.scheduler.call_at(deadline, self._toggle, group)
+        return None
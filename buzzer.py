@@ -0,0 +1,153 @@
+import heapq
+import itertools
+import threading
+import time
+
+from metrics import counter
+
+BUZZER_REQUESTS = counter('buzzer_requests_total', 'Buzzer pattern requests, by outcome', ['status'])
+
+
+class BuzzerPlayer:
+    """Plays queued beep patterns on the shared scheduler without blocking callers
+
+    A pattern is a sequence of (on_seconds, gap_seconds) steps. Higher priority
+    patterns play first; identical requests arriving faster than
+    min_repeat_interval are dropped and ones already waiting are merged.
+    """
+
+    def __init__(self, buzzer, scheduler, on_change=None, max_queue=8, min_repeat_interval=0.25):
+        self.buzzer = buzzer
+        self.scheduler = scheduler
+        self.on_change = on_change        # callback(is_on) whenever the buzzer switches
+        self.max_queue = max_queue
+        self.min_repeat_interval = min_repeat_interval
+
+        self._lock = threading.Lock()
+        self._queue = []                  # heap of (-priority, seq, pattern)
+        self._seq = itertools.count()
+        self._last_requested = {}         # pattern -> time.monotonic() of last accept
+        self._current = None              # pattern being played
+        self._steps = []
+        self._call = None
+        self._merged = 0
+        self._dropped = 0
+        self._changes = []                # switch events reported once the lock is released
+
+    def play(self, pattern, priority=0):
+        """Queue a pattern and return immediately with what happened to it"""
+        pattern = tuple((float(on), float(gap)) for on, gap in pattern)
+        if not pattern:
+            return self._result(False, 'empty')
+
+        now = time.monotonic()
+        with self._lock:
+            # Only requests inside the repeat window matter; forget older ones so
+            # client-supplied patterns cannot pile up
+            self._last_requested = {
+                known: when for known, when in self._last_requested.items()
+                if now - when < self.min_repeat_interval
+            }
+            if any(queued == pattern for _, _, queued in self._queue):
+                self._merged += 1
+                return self._result(True, 'merged')
+
+            last = self._last_requested.get(pattern)
+            if last is not None and now - last < self.min_repeat_interval:
+                self._dropped += 1
+                return self._result(False, 'rate_limited')
+
+            if len(self._queue) >= self.max_queue:
+                # Make room only by evicting something less important
+                lowest = max(self._queue)
+                if -lowest[0] >= priority:
+                    self._dropped += 1
+                    return self._result(False, 'queue_full')
+                self._queue.remove(lowest)
+                heapq.heapify(self._queue)
+                self._dropped += 1
+
+            self._last_requested[pattern] = now
+            heapq.heappush(self._queue, (-priority, next(self._seq), pattern))
+            if self._current is None:
+                self._start_next_locked()
+            result = self._result(True, 'queued')
+        self._report_changes()
+        return result
+
+    def stop(self):
+        """Silence the buzzer and discard everything queued"""
+        with self._lock:
+            self._queue = []
+            self._steps = []
+            self._current = None
+            if self._call is not None:
+                self._call.cancel()
+                self._call = None
+            self._switch(False)
+        self._report_changes()
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._queue)
+
+    def status(self):
+        with self._lock:
+            return {
+                'playing': self._current is not None,
+                'queue_depth': len(self._queue),
+                'merged': self._merged,
+                'dropped': self._dropped
+            }
+
+    def _result(self, accepted, status):
+        BUZZER_REQUESTS.inc(status)
+        return {'accepted': accepted, 'status': status, 'queue_depth': len(self._queue)}
+
+    def _switch(self, on):
+        if on:
+            self.buzzer.on()
+        else:
+            self.buzzer.off()
+        self._changes.append(on)
+
+    def _report_changes(self):
+        # Called without the lock held so listeners may call back into the player
+        with self._lock:
+            changes, self._changes = self._changes, []
+        if self.on_change is not None:
+            for on in changes:
+                self.on_change(on)
+
+    def _start_next_locked(self):
+        if not self._queue:
+            self._current = None
+            return
+        _, _, pattern = heapq.heappop(self._queue)
+        self._current = pattern
+        self._steps = list(pattern)
+        self._step_on_locked()
+
+    def _step_on_locked(self):
+        on_time = self._steps[0][0]
+        self._switch(True)
+        self._call = self.scheduler.call_later(on_time, self._step_off, self._current)
+
+    def _step_off(self, pattern):
+        with self._lock:
+            if self._current is not pattern:
+                return
+            self._switch(False)
+            _, gap = self._steps.pop(0)
+            self._call = self.scheduler.call_later(gap, self._advance, pattern)
+        self._report_changes()
+
+    def _advance(self, pattern):
+        with self._lock:
+            if self._current is not pattern:
+                return
+            if self._steps:
+                self._step_on_locked()
+            else:
+                self._start_next_locked()
+        self._report_changes()
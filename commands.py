@@ -0,0 +1,90 @@
+class CommandRegistry:
+    """Maps (device, action) to a controller handler, built once at startup
+
+    Handlers take keyword options (times/interval for blinks, level/duration
+    for brightness and fades) and return a BlinkJob for fixed-count blinks or
+    None. Voice actions such as 'green_on'
+    or 'all_blink' resolve to the same entries, so the button, batch and voice
+    paths share one table.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self._handlers = {}
+        self._voice_actions = {}
+
+        for channel in controller.channels:
+            self.register(channel, 'on', self._setter(channel, True))
+            self.register(channel, 'off', self._setter(channel, False))
+            self.register(channel, 'blink', self._blinker(channel))
+            self.register(channel, 'brightness', self._dimmer(channel))
+            self.register(channel, 'fade', self._fader(channel))
+
+        self.register('all', 'on', lambda **options: controller.all_on())
+        self.register('all', 'off', lambda **options: controller.all_off())
+        self.register('all', 'blink', lambda times=None, interval=0.5: controller.blink_all(times, interval))
+        self.register('all', 'brightness', self._dimmer(*controller.channels))
+        self.register('all', 'fade', self._fader(*controller.channels))
+        self.register('buzzer', 'buzz', self._buzz, voice_action='buzzer')
+        for name in controller.scene_names():
+            self.register_scene(name)
+        self.register('scene', 'stop', self._stop_scene, voice_action='scene_stop')
+
+    def _buzz(self, **options):
+        # The queue result is not a job; callers only expect a BlinkJob or None
+        self.controller.buzz(0.3)
+
+    def register_scene(self, name):
+        """Make a scene startable as scene/<name> and by the 'scene_<name>' voice action"""
+        self.register('scene', name, self._scene_player(name), voice_action=f'scene_{name}')
+
+    def _scene_player(self, name):
+        # Scenes are not BlinkJobs; report them through /api/scenes instead
+        def play(**options):
+            self.controller.play_scene(name)
+        return play
+
+    def _stop_scene(self, **options):
+        self.controller.stop_scene()
+
+    def _setter(self, channel, on):
+        return lambda **options: self.controller.set(channel, on)
+
+    def _blinker(self, channel):
+        return lambda times=None, interval=0.5: self.controller.blink(channel, times, interval)
+
+    def _dimmer(self, *channels):
+        def set_brightness(level=1.0, **options):
+            with self.controller.batch():
+                for channel in channels:
+                    self.controller.set_brightness(channel, level)
+        return set_brightness
+
+    def _fader(self, *channels):
+        def fade(level=0.0, duration=1.0, **options):
+            # Fades report their progress through the state stream, not as jobs
+            with self.controller.batch():
+                for channel in channels:
+                    self.controller.fade(channel, level, duration)
+        return fade
+
+    def register(self, device, action, handler, voice_action=None):
+        self._handlers[(device, action)] = handler
+        self._voice_actions[voice_action or f'{device}_{action}'] = (device, action)
+
+    def has(self, device, action):
+        return (device, action) in self._handlers
+
+    def actions(self, device):
+        return [action for (name, action) in self._handlers if name == device]
+
+    def devices(self):
+        return sorted({device for device, _ in self._handlers})
+
+    def dispatch(self, device, action, **options):
+        """Run a command; raises KeyError for an unknown (device, action)"""
+        return self._handlers[(device, action)](**options)
+
+    def resolve_voice_action(self, voice_action):
+        """(device, action) for a voice action name such as 'red_blink', or None"""
+        return self._voice_actions.get(voice_action)
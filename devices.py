@@ -0,0 +1,245 @@
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from Leds import MAX_CHANNELS
+from admission import COALESCED_ACTIONS, RateLimited
+
+# Device names that would shadow existing /api/<name>/... routes
+RESERVED_NAMES = {'all', 'led', 'jobs', 'scenes', 'buzzer', 'states', 'dht', 'stream',
+                  'health', 'telemetry', 'batch', 'devices', 'voice_command', 'listen',
+                  'set_language', 'get_language'}
+# Names the command registry already uses for non-LED targets
+RESERVED_CHANNELS = {'all', 'buzzer', 'scene'}
+
+DEFAULT_TIMEOUT = 1.0
+
+
+def load_config(path):
+    """Read a devices.json file; see devices.example.json for the format"""
+    with open(path) as f:
+        config = json.load(f)
+    devices = config.get('devices')
+    if not isinstance(devices, dict) or not devices:
+        raise ValueError(f'{path}: "devices" must be a non-empty object')
+    local = [name for name, device in devices.items() if device.get('type', 'local') == 'local']
+    if len(local) != 1:
+        raise ValueError(f'{path}: exactly one local device is required, found {len(local)}')
+    for name, device in devices.items():
+        if name in RESERVED_NAMES or not name.isidentifier():
+            raise ValueError(f'{path}: invalid device name {name!r}')
+        if device.get('type', 'local') not in ('local', 'remote'):
+            raise ValueError(f'{path}: device {name!r} has unknown type {device.get("type")!r}')
+        if device.get('type') == 'remote' and not device.get('url'):
+            raise ValueError(f'{path}: remote device {name!r} needs a url')
+        if len(device.get('channels', {})) > MAX_CHANNELS:
+            raise ValueError(f'{path}: device {name!r} has more than {MAX_CHANNELS} channels')
+        clash = RESERVED_CHANNELS.intersection(device.get('channels', {}))
+        if clash:
+            raise ValueError(f'{path}: device {name!r} uses reserved channel names {sorted(clash)}')
+    return devices
+
+
+class LocalDevice:
+    """The board this process drives, reached through its command registry"""
+
+    kind = 'local'
+
+    def __init__(self, name, controller, registry, parse_options, admission=None):
+        self.name = name
+        self.controller = controller
+        self.registry = registry
+        self.parse_options = parse_options   # (action, body) -> handler options
+        self.admission = admission           # channel limits and debouncing, as for /api/led
+
+    def dispatch(self, channel, action, body):
+        if not self.registry.has(channel, action):
+            return {'success': False, 'error': f'Unknown command {channel}/{action}', 'status': 404}
+        try:
+            options = self.parse_options(action, body)
+        except (TypeError, ValueError) as e:
+            return {'success': False, 'error': str(e), 'status': 400}
+
+        def command():
+            job = self.registry.dispatch(channel, action, **options)
+            result = {'success': True, 'states': self.controller.get_states()}
+            if job is not None:
+                result['job'] = job.to_dict()
+            return result
+
+        if self.admission is None:
+            return command()
+        try:
+            # The caller charges the client; the channel is charged here
+            self.admission.check(None, channel)
+        except RateLimited as e:
+            return {'success': False, 'error': str(e), 'retry_after': round(e.retry_after, 3),
+                    'status': 429}
+        if action not in COALESCED_ACTIONS:
+            return command()
+        result, coalesced = self.admission.run(channel, command)
+        return dict(result, coalesced=True) if coalesced else result
+
+    def describe(self):
+        return {
+            'type': self.kind,
+            'online': True,
+            'channels': list(self.controller.channels),
+            'states': self.controller.get_states()
+        }
+
+
+class RemoteDevice:
+    """Another board running this app, driven over keep-alive HTTP/JSON
+
+    Commands go to the board's own /api/led/<channel>/<action> endpoint, so
+    remote boards need no extra service. Connections are pooled and reused;
+    every call is bounded by timeout seconds.
+    """
+
+    kind = 'remote'
+
+    def __init__(self, name, url, timeout=DEFAULT_TIMEOUT, pool_size=4):
+        self.name = name
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        parts = urlsplit(self.url)
+        self._https = parts.scheme == 'https'
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self.last_error = None
+        self.last_seen = None             # time.monotonic() of the last answer
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return connection_class(self._host, self._port, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        # A pooled connection may have been closed by the board; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                connection = self._pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self._connect()
+                reused = False
+            try:
+                connection.request(method, self._prefix + path, body=payload, headers=headers)
+                response = connection.getresponse()
+                data = json.loads(response.read() or b'{}')
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            try:
+                self._pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+            self.last_seen, self.last_error = time.monotonic(), None
+            if response.status >= 400:
+                data.setdefault('success', False)
+                data['status'] = response.status
+            return data
+
+    def dispatch(self, channel, action, body):
+        try:
+            return self._request('POST', f'/api/led/{channel}/{action}', body)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.last_error = str(e) or type(e).__name__
+            return {'success': False, 'error': f'{self.name} unreachable: {self.last_error}', 'status': 502}
+
+    def describe(self):
+        try:
+            data = self._request('GET', '/api/states')
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.last_error = str(e) or type(e).__name__
+            return {'type': self.kind, 'url': self.url, 'online': False, 'error': self.last_error}
+        states = data.get('states', {})
+        return {
+            'type': self.kind,
+            'url': self.url,
+            'online': True,
+            'channels': [name for name in states if name + '_blink' in states],
+            'states': states
+        }
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class DeviceRegistry:
+    """Named local and remote boards; fans commands out to several at once"""
+
+    def __init__(self, max_workers=8):
+        self._devices = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='device-rpc')
+        self._lock = threading.Lock()
+
+    def add(self, device):
+        with self._lock:
+            self._devices[device.name] = device
+
+    def get(self, name):
+        return self._devices.get(name)
+
+    def names(self):
+        return list(self._devices)
+
+    def dispatch(self, names, channel, action, body, timeout=None):
+        """Run a command on each named device concurrently
+
+        Returns {name: result}. Devices that have not answered within timeout
+        seconds (default: the slowest device timeout plus a margin) are reported
+        as timed out, so one dead board cannot stall the whole request.
+        """
+        devices = [self._devices[name] for name in names]
+        if len(devices) == 1:
+            return {devices[0].name: devices[0].dispatch(channel, action, body)}
+        if timeout is None:
+            timeout = max(getattr(device, 'timeout', 0) for device in devices) * 2 + 0.5
+        futures = {self._executor.submit(device.dispatch, channel, action, body): device.name
+                   for device in devices}
+        done, _ = wait(futures, timeout=timeout)
+        results = {}
+        for future, name in futures.items():
+            if future in done:
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {'success': False, 'error': str(e), 'status': 500}
+            else:
+                results[name] = {'success': False, 'error': f'{name} timed out', 'status': 504}
+        return results
+
+    def describe(self):
+        futures = {name: self._executor.submit(device.describe)
+                   for name, device in self._devices.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        for device in self._devices.values():
+            if device.kind == 'remote':
+                device.close()
+        self._executor.shutdown(wait=False)
+
+
+def config_path():
+    """Config file named by LED_DEVICES_CONFIG, or None for the single built-in board"""
+    return os.environ.get('LED_DEVICES_CONFIG') or None
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+
+def _merge(target, changes):
+    """Merge nested change dicts so later values win"""
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif isinstance(value, dict):
+            target[key] = dict(value)
+        else:
+            target[key] = value
+
+
+class Subscription:
+    """Per-client mailbox holding the changes not yet sent to that client"""
+
+    def __init__(self, coalesce_window):
+        self.coalesce_window = coalesce_window
+        self._cond = threading.Condition()
+        self._pending = {}
+        self.closed = False
+
+    def push(self, changes):
+        with self._cond:
+            _merge(self._pending, changes)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Block until changes arrive; returns the merged dict or None on timeout"""
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            if not self._pending:
+                return None
+        # Let a burst of updates land so they go out as one message
+        if self.coalesce_window:
+            time.sleep(self.coalesce_window)
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+class StateBroadcaster:
+    """Fans controller change notifications out to Server-Sent Events clients"""
+
+    def __init__(self, coalesce_window=0.05, keepalive=15.0, max_clients=None):
+        self.coalesce_window = coalesce_window
+        self.keepalive = keepalive
+        self.max_clients = max_clients    # None = unlimited
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def publish(self, changes):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.push(changes)
+
+    def subscribe(self):
+        """New subscription, or None when max_clients streams are already open"""
+        subscription = Subscription(self.coalesce_window)
+        with self._lock:
+            if self.max_clients is not None and len(self._subscriptions) >= self.max_clients:
+                return None
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def client_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def stream(self, initial, subscription):
+        """Generator of SSE frames for subscription: a full snapshot first, then only changes"""
+        try:
+            yield f"data: {json.dumps(initial)}\n\n"
+            while not subscription.closed:
+                changes = subscription.get(timeout=self.keepalive)
+                if changes is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(changes)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
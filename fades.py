@@ -0,0 +1,112 @@
+import threading
+import time
+
+
+class Fade:
+    """One output ramping linearly from start to target brightness"""
+
+    def __init__(self, channel, led, start, target, duration, start_time):
+        self.channel = channel
+        self.led = led
+        self.start = start
+        self.target = target
+        self.duration = duration
+        self.start_time = start_time
+        self.step = 0
+        self.last_report = start_time
+        self.call = None
+        self.status = 'running'           # running | done | cancelled
+
+    def value_at(self, now):
+        if self.duration <= 0:
+            return self.target
+        progress = min((now - self.start_time) / self.duration, 1.0)
+        return self.start + (self.target - self.start) * progress
+
+    def to_dict(self):
+        return {
+            'channel': self.channel,
+            'from': round(self.start, 3),
+            'to': round(self.target, 3),
+            'duration': self.duration,
+            'status': self.status
+        }
+
+
+class FadeEngine:
+    """Ramps PWM outputs on the shared scheduler, rate updates per second
+
+    Each update computes the brightness from the elapsed time, so a late tick
+    lands on the right value instead of slowing the fade down. on_progress(fade)
+    is called at most every report_interval seconds and once more when the fade
+    ends, always outside the engine lock.
+    """
+
+    def __init__(self, scheduler, rate=50.0, report_interval=0.1, on_progress=None):
+        self.scheduler = scheduler
+        self.rate = rate
+        self.report_interval = report_interval
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        self._fades = {}                  # channel -> Fade
+
+    def fade(self, channel, led, target, duration):
+        """Start fading led to target (0-1) over duration seconds, replacing any fade on it"""
+        with self._lock:
+            self._stop_locked(channel)
+            fade = Fade(channel, led, led.value, target, duration, time.monotonic())
+            self._fades[channel] = fade
+            self._tick_locked(fade)
+        # A zero-length fade ends in its first tick; report it like any other end
+        if fade.status == 'done' and self.on_progress is not None:
+            self.on_progress(fade)
+        return fade
+
+    def stop(self, channel):
+        """Stop fading a channel, leaving it at its current brightness"""
+        with self._lock:
+            return self._stop_locked(channel)
+
+    def stop_all(self):
+        with self._lock:
+            for channel in list(self._fades):
+                self._stop_locked(channel)
+
+    def current(self, channel):
+        with self._lock:
+            return self._fades.get(channel)
+
+    def _stop_locked(self, channel):
+        fade = self._fades.pop(channel, None)
+        if fade is None:
+            return False
+        if fade.call is not None:
+            fade.call.cancel()
+        fade.status = 'cancelled'
+        return True
+
+    def _tick(self, fade):
+        report = False
+        with self._lock:
+            if self._fades.get(fade.channel) is not fade:
+                return
+            report = self._tick_locked(fade)
+        if report and self.on_progress is not None:
+            self.on_progress(fade)
+
+    def _tick_locked(self, fade):
+        now = time.monotonic()
+        fade.led.value = fade.value_at(now)
+        if now - fade.start_time >= fade.duration:
+            fade.status = 'done'
+            del self._fades[fade.channel]
+            return True
+
+        # Absolute deadlines; skip steps missed while the scheduler was busy
+        period = 1.0 / self.rate
+        fade.step = max(fade.step + 1, int((now - fade.start_time) / period) + 1)
+        fade.call = self.scheduler.call_at(fade.start_time + fade.step * period, self._tick, fade)
+        if now - fade.last_report >= self.report_interval:
+            fade.last_report = now
+            return True
+        return False
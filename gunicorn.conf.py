@@ -0,0 +1,27 @@
+# Production settings for `gunicorn -c gunicorn.conf.py wsgi:app` (see run.sh)
+import os
+
+bind = os.environ.get('LED_BIND', '0.0.0.0:5000')
+
+# Exactly one process may own the GPIO pins (LEDController takes a lock file),
+# so scale with threads instead of workers
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('LED_THREADS', 32))
+
+# Build the controller inside the worker, never in the forking master
+preload_app = False
+
+# Reuse connections from polling dashboards and automation clients
+keepalive = 5
+
+# /api/stream keeps a thread per dashboard for as long as it is open; the app
+# caps open streams at LED_MAX_STREAMS (default LED_THREADS - 8) so buttons and
+# API calls always have threads left. Raise LED_THREADS for more dashboards.
+# The gthread worker's heartbeat is independent of request length, so long
+# streams are fine
+timeout = 30
+graceful_timeout = 10
+
+accesslog = os.environ.get('LED_ACCESS_LOG')   # unset: no per-request log I/O
+errorlog = '-'
@@ -0,0 +1,81 @@
+import struct
+import threading
+
+try:
+    import msgpack
+except ImportError:                       # optional: only offered when installed
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+# Packed states: STATES_HEADER, then one byte per brightness level (0-255)
+STATES = 'application/vnd.act7.states'
+STATES_HEADER = struct.Struct('<II')      # snapshot version, on/blink flag bits
+
+
+def available_formats():
+    """Media types the API can answer with, JSON first so it wins ties"""
+    formats = [JSON, STATES]
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    return formats
+
+
+class StateEncoder:
+    """Encodes state snapshots once per version and format
+
+    The last encoding of each format is kept with its version, so repeated
+    reads between changes reuse the same bytes. The packed format sets bit i
+    of the flags for flags[i] and appends levels in order, scaled to a byte;
+    both lists come from the first snapshot and are served by schema().
+    boot identifies the process, since versions restart at 0 in each one.
+    """
+
+    def __init__(self, states, dumps_json, boot=None):
+        self.flags = sorted(name for name, value in states.items() if isinstance(value, bool))
+        self.levels = sorted(name for name, value in states.items()
+                             if isinstance(value, float))
+        self.dumps_json = dumps_json      # payload -> bytes, as jsonify would send it
+        self.boot = boot
+        self._cache = {}                  # media type -> (version, bytes)
+        self._lock = threading.Lock()
+
+    def schema(self):
+        return {'format': STATES, 'boot': self.boot, 'header': 'version u32, flags u32 (little-endian)',
+                'flags': self.flags, 'levels': self.levels}
+
+    def encode(self, snapshot, media_type):
+        cached = self._cache.get(media_type)
+        if cached is not None and cached[0] == snapshot.version:
+            return cached[1]
+        data = self._encode(snapshot, media_type)
+        with self._lock:
+            # Never replace a newer version with an older one from a slow thread
+            current = self._cache.get(media_type)
+            if current is None or current[0] <= snapshot.version:
+                self._cache[media_type] = (snapshot.version, data)
+        return data
+
+    def _encode(self, snapshot, media_type):
+        if media_type == STATES:
+            return self.pack(snapshot)
+        payload = {'success': True, 'boot': self.boot, 'version': snapshot.version,
+                   'states': dict(snapshot.states)}
+        if media_type == MSGPACK:
+            return msgpack.packb(payload)
+        return self.dumps_json(payload)
+
+    def pack(self, snapshot):
+        states = snapshot.states
+        bits = 0
+        for index, name in enumerate(self.flags):
+            if states.get(name):
+                bits |= 1 << index
+        levels = bytes(round(min(max(states.get(name, 0.0), 0.0), 1.0) * 255) for name in self.levels)
+        return STATES_HEADER.pack(snapshot.version & 0xFFFFFFFF, bits) + levels
+
+    def encode_payload(self, payload, media_type):
+        """Uncached encoding of any response dict in a non-packed format"""
+        if media_type == MSGPACK:
+            return msgpack.packb(payload)
+        return self.dumps_json(payload)
@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import counter
+
+RULES_FIRED = counter('rules_fired_total', 'Rule activations that ran their actions', ['rule'])
+
+METRICS = ('temperature', 'humidity')
+MAX_RULES = 32
+MAX_ACTIONS = 8
+MAX_WINDOW = 3600.0
+
+
+class Condition:
+    """Threshold with hysteresis: active above/below a level, cleared past a second one"""
+
+    def __init__(self, spec):
+        if 'above' in spec:
+            self.direction = 1
+            self.level = float(spec['above'])
+            self.clear = float(spec.get('clear_below', self.level))
+            if self.clear > self.level:
+                raise ValueError('clear_below must not be above the trigger level')
+        elif 'below' in spec:
+            self.direction = -1
+            self.level = float(spec['below'])
+            self.clear = float(spec.get('clear_above', self.level))
+            if self.clear < self.level:
+                raise ValueError('clear_above must not be below the trigger level')
+        else:
+            raise ValueError("condition needs 'above', 'below', 'rising' or 'falling'")
+
+    def update(self, now, value, active):
+        if self.direction > 0:
+            return value > self.level if not active else value > self.clear
+        return value < self.level if not active else value < self.clear
+
+
+class RateCondition:
+    """Change of at least `by` within the last `window` seconds
+
+    Keeps a monotonic deque of the window's samples, so the lowest (rising) or
+    highest (falling) value in the window is known in O(1) per sample.
+    """
+
+    def __init__(self, spec):
+        self.direction = 1 if 'rising' in spec else -1
+        self.by = float(spec['rising' if self.direction > 0 else 'falling'])
+        self.window = float(spec.get('window', 60))
+        if self.by <= 0:
+            raise ValueError('rising/falling must be a positive change')
+        if not 0 < self.window <= MAX_WINDOW:
+            raise ValueError(f'window must be between 0 and {MAX_WINDOW:g} seconds')
+        self._samples = deque()           # (time, value), extreme value first
+
+    def update(self, now, value, active):
+        samples = self._samples
+        while samples and samples[0][0] < now - self.window:
+            samples.popleft()
+        # Drop samples a new value makes irrelevant as the window's extreme
+        while samples and (samples[-1][1] - value) * self.direction >= 0:
+            samples.pop()
+        samples.append((now, value))
+        return (value - samples[0][1]) * self.direction >= self.by
+
+
+class Rule:
+    """A condition on one DHT metric with actions run when it turns active (and clears)"""
+
+    def __init__(self, name, definition, validate_action):
+        self.name = name
+        self.definition = definition
+        self.metric = definition.get('metric')
+        if self.metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+        spec = definition.get('condition')
+        if not isinstance(spec, dict):
+            raise ValueError('condition must be an object')
+        if 'rising' in spec or 'falling' in spec:
+            self.condition = RateCondition(spec)
+        else:
+            self.condition = Condition(spec)
+        self.actions = self._actions(definition.get('actions'), validate_action, required=True)
+        self.clear_actions = self._actions(definition.get('clear_actions'), validate_action)
+        self.cooldown = float(definition.get('cooldown', 60))
+        if self.cooldown < 0:
+            raise ValueError('cooldown must be >= 0')
+        self.enabled = bool(definition.get('enabled', True))
+
+        self.active = False
+        self.fired = False                # the current activation ran its actions
+        self.last_fired = None            # time.monotonic()
+        self.last_fired_at = None         # time.time(), for reporting
+        self.fire_count = 0
+
+    @staticmethod
+    def _actions(actions, validate_action, required=False):
+        if actions is None and not required:
+            return []
+        if not isinstance(actions, list) or not actions or len(actions) > MAX_ACTIONS:
+            raise ValueError(f'actions must be a list of 1 to {MAX_ACTIONS} commands')
+        parsed = []
+        for index, action in enumerate(actions):
+            if not isinstance(action, dict):
+                raise ValueError(f'Action {index} must be an object')
+            try:
+                parsed.append(validate_action(action))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f'Action {index}: {e}')
+        return parsed
+
+    def evaluate(self, now, value):
+        """Feed one sample; returns the actions to run now (possibly none)"""
+        active = self.condition.update(now, value, self.active)
+        if active == self.active or not self.enabled:
+            self.active = active and self.enabled
+            return []
+        self.active = active
+        if active:
+            if self.last_fired is not None and now - self.last_fired < self.cooldown:
+                self.fired = False
+                return []
+            self.fired = True
+            self.last_fired, self.last_fired_at = now, time.time()
+            self.fire_count += 1
+            RULES_FIRED.inc(self.name)
+            return self.actions
+        fired, self.fired = self.fired, False
+        return self.clear_actions if fired else []
+
+    def to_dict(self):
+        info = dict(self.definition)
+        info.update({
+            'name': self.name,
+            'active': self.active,
+            'fire_count': self.fire_count,
+            'last_fired': self.last_fired_at
+        })
+        return info
+
+
+class RulesEngine:
+    """Reacts to every DHT sample on the device, without a browser in the loop
+
+    validate_action(action_dict) checks an action and returns the form passed
+    to run_action when the rule fires; rules are saved to path as JSON on
+    every change. on_change(name, rule_dict) hears activations and clears.
+    Actions run on the sampler thread, after the engine lock is released.
+    """
+
+    def __init__(self, path, validate_action, run_action, on_change=None):
+        self.path = path
+        self.validate_action = validate_action
+        self.run_action = run_action
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._rules = {}
+
+    def load(self):
+        """Read saved rules; rules that no longer validate are skipped and reported"""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Rules file error: {e}")
+            return
+        saved = saved.get('rules', {}) if isinstance(saved, dict) else None
+        if not isinstance(saved, dict):
+            print(f"Rules file error: {self.path} has no 'rules' object")
+            return
+        for name, definition in saved.items():
+            try:
+                if not isinstance(definition, dict):
+                    raise ValueError('definition must be an object')
+                rule = Rule(name, definition, self.validate_action)
+            except (TypeError, ValueError) as e:
+                print(f"Skipping rule {name}: {e}")
+                continue
+            with self._lock:
+                self._rules[name] = rule
+
+    def _save_locked(self, rules):
+        data = {'rules': {name: rule.definition for name, rule in rules.items()}}
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def define(self, name, definition):
+        """Add or replace a rule; raises ValueError when the definition is invalid"""
+        if not name.isidentifier():
+            raise ValueError('Rule names may only contain letters, digits and underscores')
+        rule = Rule(name, definition, self.validate_action)
+        with self._lock:
+            if name not in self._rules and len(self._rules) >= MAX_RULES:
+                raise ValueError(f'At most {MAX_RULES} rules')
+            # Save first, so a failed write leaves the live rules unchanged
+            rules = dict(self._rules)
+            rules[name] = rule
+            self._save_locked(rules)
+            self._rules = rules
+        return rule
+
+    def remove(self, name):
+        with self._lock:
+            if name not in self._rules:
+                return False
+            rules = dict(self._rules)
+            del rules[name]
+            self._save_locked(rules)
+            self._rules = rules
+        return True
+
+    def rules(self):
+        with self._lock:
+            return [rule.to_dict() for rule in self._rules.values()]
+
+    def get(self, name):
+        with self._lock:
+            rule = self._rules.get(name)
+            return rule.to_dict() if rule is not None else None
+
+    def on_sample(self, temperature, humidity):
+        """Controller sample listener: evaluate every rule against the new reading"""
+        now = time.monotonic()
+        values = {'temperature': temperature, 'humidity': humidity}
+        triggered = []
+        with self._lock:
+            for rule in self._rules.values():
+                was_active = rule.active
+                actions = rule.evaluate(now, values[rule.metric])
+                if rule.active != was_active:
+                    triggered.append((rule.name, rule.to_dict(), actions))
+        for name, info, actions in triggered:
+            for action in actions:
+                try:
+                    self.run_action(action)
+                except Exception as e:
+                    print(f"Rule {name} action error: {e}")
+            if self.on_change is not None:
+                self.on_change(name, info)
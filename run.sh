@@ -1,5 +1,13 @@
 #!/bin/bash
 # Activation script for act7
+#   ./run.sh        development server (Werkzeug)
+#   ./run.sh prod   production server (gunicorn, single GPIO-owning process)
 cd /home/pi/Documents/Embedded/act7
 source .venv/bin/activate
+
+if [ "$1" = "prod" ]; then
+    # Precompressed, fingerprinted dashboard served from memory
+    python assets.py --output build
+    LED_ASSETS_DIR=build exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
 python app.py
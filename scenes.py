@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import namedtuple
+
+from blink import _set
+
+# One precompiled frame: when it starts (seconds into the loop), the channels
+# lit while it shows and the switches needed coming from the previous frame
+Frame = namedtuple('Frame', ['offset', 'lit', 'turn_on', 'turn_off'])
+
+# Built-in scenes; steps list the channels lit for each duration, loops=None repeats forever
+SCENES = {
+    'chase': {
+        'steps': [
+            {'on': ['green'], 'duration': 0.15},
+            {'on': ['blue'], 'duration': 0.15},
+            {'on': ['red'], 'duration': 0.15}
+        ],
+        'loops': None
+    },
+    'police': {
+        'steps': [
+            {'on': ['red'], 'duration': 0.08}, {'on': [], 'duration': 0.06},
+            {'on': ['red'], 'duration': 0.08}, {'on': [], 'duration': 0.06},
+            {'on': ['blue'], 'duration': 0.08}, {'on': [], 'duration': 0.06},
+            {'on': ['blue'], 'duration': 0.08}, {'on': [], 'duration': 0.06}
+        ],
+        'loops': None
+    },
+    'heartbeat': {
+        'steps': [
+            {'on': ['red'], 'duration': 0.1}, {'on': [], 'duration': 0.12},
+            {'on': ['red'], 'duration': 0.1}, {'on': [], 'duration': 0.7}
+        ],
+        'loops': None
+    },
+    'alert': {
+        'steps': [
+            {'on': ['red', 'blue', 'green'], 'duration': 0.25},
+            {'on': [], 'duration': 0.25}
+        ],
+        'loops': 6
+    }
+}
+
+MIN_STEP = 0.02
+MAX_STEP = 10.0
+MAX_STEPS = 200
+
+
+class CompiledScene:
+    """A scene flattened into per-loop frames holding only the switches to make"""
+
+    def __init__(self, name, channels, frames, period, loops):
+        self.name = name
+        self.channels = channels          # every channel the scene drives
+        self.frames = frames              # Frames for one loop, by offset
+        self.period = period              # seconds per loop
+        self.loops = loops                # None = forever
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'channels': list(self.channels),
+            'period': round(self.period, 3),
+            'frames': len(self.frames),
+            'loops': self.loops
+        }
+
+
+def compile_scene(name, definition, known_channels):
+    """Validate a declarative scene and compile it into frames
+
+    definition: {"steps": [{"on": [channel, ...], "duration": seconds}, ...],
+                 "loops": n or None}. Raises ValueError when invalid.
+    """
+    steps = definition.get('steps')
+    if not isinstance(steps, list) or not steps:
+        raise ValueError('steps must be a non-empty list')
+    if len(steps) > MAX_STEPS:
+        raise ValueError(f'At most {MAX_STEPS} steps per scene')
+    loops = definition.get('loops')
+    if loops is not None:
+        loops = int(loops)
+        if loops < 1:
+            raise ValueError('loops must be >= 1')
+
+    lit_sets, durations = [], []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ValueError(f'Step {index} must be an object')
+        lit = step.get('on', [])
+        if not isinstance(lit, list) or any(channel not in known_channels for channel in lit):
+            raise ValueError(f"Step {index}: 'on' must list channels from {', '.join(known_channels)}")
+        duration = float(step.get('duration', 0))
+        if not MIN_STEP <= duration <= MAX_STEP:
+            raise ValueError(f'Step {index}: duration must be between {MIN_STEP} and {MAX_STEP} seconds')
+        # Consecutive identical steps become one longer frame
+        if lit_sets and lit_sets[-1] == frozenset(lit):
+            durations[-1] += duration
+        else:
+            lit_sets.append(frozenset(lit))
+            durations.append(duration)
+    if len(lit_sets) > 1 and lit_sets[0] == lit_sets[-1]:
+        # The last step runs straight into the first one of the next loop
+        lit_sets.pop()
+        durations[0] += durations.pop()
+
+    channels = tuple(channel for channel in known_channels
+                     if any(channel in lit for lit in lit_sets))
+    if not channels:
+        raise ValueError('A scene must light at least one channel')
+
+    frames, offset = [], 0.0
+    previous = lit_sets[-1] if len(lit_sets) > 1 else frozenset()
+    for lit, duration in zip(lit_sets, durations):
+        frames.append(Frame(offset, lit, tuple(sorted(lit - previous)), tuple(sorted(previous - lit))))
+        previous = lit
+        offset += duration
+    return CompiledScene(name, channels, frames, offset, loops)
+
+
+class ScenePlayback:
+    """A scene running on a set of outputs"""
+
+    def __init__(self, scene, leds, start_time, on_complete):
+        self.scene = scene
+        self.leds = leds                  # channel -> gpiozero output
+        self.start_time = start_time
+        self.on_complete = on_complete
+        self.loop = 0
+        self.index = 0
+        self.call = None
+        self.status = 'running'           # running | done | stopped
+
+    def to_dict(self):
+        info = self.scene.to_dict()
+        info.update({'loop': self.loop, 'status': self.status})
+        return info
+
+
+class SceneEngine:
+    """Plays one compiled scene at a time from the shared scheduler
+
+    Frames are scheduled at absolute deadlines (start + loop * period + offset),
+    so timing never drifts; frames missed while the scheduler was busy are
+    skipped and the outputs jump straight to the frame that should be showing.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+        self._playback = None
+
+    def play(self, scene, leds, on_complete=None):
+        """Start a scene on leds (channel -> output), replacing any running one
+
+        on_complete(playback) runs once a scene with a loop count finishes or
+        any scene is stopped through stop().
+        """
+        with self._lock:
+            previous = self._stop_locked('stopped')
+            playback = ScenePlayback(scene, leds, time.monotonic(), on_complete)
+            self._playback = playback
+            self._show_locked(playback, resync=True)
+        self._report(previous)
+        return playback
+
+    def stop(self):
+        """Stop the running scene, leaving its outputs off"""
+        with self._lock:
+            playback = self._stop_locked('stopped')
+        self._report(playback)
+        return playback is not None
+
+    def release(self, channel):
+        """Stop the scene if it drives channel; the caller takes the output over"""
+        with self._lock:
+            if self._playback is None or channel not in self._playback.leds:
+                return None
+            playback = self._stop_locked('stopped')
+        self._report(playback)
+        return playback
+
+    def current(self):
+        with self._lock:
+            return self._playback
+
+    def _stop_locked(self, status):
+        playback = self._playback
+        if playback is None:
+            return None
+        self._playback = None
+        if playback.call is not None:
+            playback.call.cancel()
+        for led in playback.leds.values():
+            led.off()
+        playback.status = status
+        return playback
+
+    def _report(self, playback):
+        # Completion callbacks run outside the lock so they can call back in
+        if playback is not None and playback.on_complete is not None:
+            playback.on_complete(playback)
+
+    def _show_locked(self, playback, resync=False):
+        frame = playback.scene.frames[playback.index]
+        if resync:
+            # Set every output, not just the switches from the previous frame
+            for channel, led in playback.leds.items():
+                _set(led, channel in frame.lit)
+        else:
+            for channel in frame.turn_off:
+                _set(playback.leds[channel], False)
+            for channel in frame.turn_on:
+                _set(playback.leds[channel], True)
+        self._schedule_next_locked(playback)
+
+    def _schedule_next_locked(self, playback):
+        scene = playback.scene
+        playback.index += 1
+        if playback.index == len(scene.frames):
+            playback.index = 0
+            playback.loop += 1
+        deadline = (playback.start_time + playback.loop * scene.period
+                    + scene.frames[playback.index].offset)
+        playback.call = self.scheduler.call_at(deadline, self._frame, playback)
+
+    def _frame(self, playback):
+        finished = None
+        with self._lock:
+            if self._playback is not playback:
+                return
+            scene = playback.scene
+            if scene.loops is not None and playback.loop >= scene.loops:
+                finished = self._stop_locked('done')
+            else:
+                self._show_locked(playback, resync=self._catch_up_locked(playback))
+        self._report(finished)
+
+    def _catch_up_locked(self, playback):
+        """Move to the frame due now if the scheduler fell behind; True if frames were skipped"""
+        scene = playback.scene
+        elapsed = time.monotonic() - playback.start_time
+        loop = int(elapsed // scene.period)
+        if scene.loops is not None:
+            loop = min(loop, scene.loops - 1)
+        into_loop = elapsed - loop * scene.period
+        index = 0
+        while index + 1 < len(scene.frames) and scene.frames[index + 1].offset <= into_loop:
+            index += 1
+        if (loop, index) <= (playback.loop, playback.index):
+            return False
+        playback.loop, playback.index = loop, index
+        return True
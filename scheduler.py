@@ -0,0 +1,98 @@
+import heapq
+import itertools
+import threading
+import time
+
+from metrics import histogram
+
+# How late callbacks run relative to their deadline
+LATENESS_SECONDS = histogram('scheduler_lateness_seconds', 'Delay between a deadline and its callback')
+
+
+class ScheduledCall:
+    """Handle for a pending scheduler callback"""
+
+    __slots__ = ('deadline', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """One timer thread running callbacks at absolute time.monotonic() deadlines"""
+
+    def __init__(self, name='led-scheduler'):
+        self.name = name
+        self._cond = threading.Condition()
+        self._queue = []                  # heap of (deadline, seq, ScheduledCall)
+        self._seq = itertools.count()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._running = False
+            self._queue = []
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def call_at(self, deadline, callback, *args):
+        call = ScheduledCall(deadline, callback, args)
+        with self._cond:
+            heapq.heappush(self._queue, (deadline, next(self._seq), call))
+            # Only wake the thread if this is now the earliest deadline
+            if self._queue[0][2] is call:
+                self._cond.notify()
+        return call
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for _, _, call in self._queue if not call.cancelled)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._queue:
+                        self._cond.wait()
+                        continue
+                    delay = self._queue[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if not self._running:
+                    return
+                # Everything due now runs in the same tick
+                now = time.monotonic()
+                due = []
+                while self._queue and self._queue[0][0] <= now:
+                    due.append(heapq.heappop(self._queue)[2])
+
+            for call in due:
+                if call.cancelled:
+                    continue
+                LATENESS_SECONDS.observe(time.monotonic() - call.deadline)
+                try:
+                    call.callback(*call.args)
+                except Exception as e:
+                    print(f"Scheduler callback error: {e}")
@@ -0,0 +1,319 @@
+import math
+import threading
+import time
+from array import array
+
+from metrics import counter, histogram
+
+DHT_READ_SECONDS = histogram('dht_read_duration_seconds', 'Duration of DHT11 sensor reads')
+DHT_READS = counter('dht_reads_total', 'DHT11 read attempts by outcome', ['result'])
+
+# Most buckets /api/dht/history returns; coarser resolutions are used beyond that
+MAX_HISTORY_POINTS = 500
+# Widened resolutions snap up to one of these (seconds), then to whole days
+RESOLUTION_STEPS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600,
+                    7200, 10800, 21600, 43200, 86400)
+
+
+def _snap_resolution(seconds):
+    for step in RESOLUTION_STEPS:
+        if step >= seconds:
+            return float(step)
+    return math.ceil(seconds / 86400) * 86400.0
+
+
+def _concat(values, parts):
+    result = values[parts[0][0]:parts[0][1]]
+    for start, end in parts[1:]:
+        result += values[start:end]
+    return result
+
+
+class ReadingHistory:
+    """Fixed-size ring buffer of (timestamp, temperature, humidity) samples
+
+    Samples live in three preallocated arrays, so memory stays constant
+    (16 bytes per slot) however long the server runs. Timestamps are wall-clock
+    seconds and assumed non-decreasing.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self._times = array('d', bytes(8 * self.capacity))
+        self._temperature = array('f', bytes(4 * self.capacity))
+        self._humidity = array('f', bytes(4 * self.capacity))
+        self._start = 0                   # slot of the oldest sample
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, temperature, humidity):
+        with self._lock:
+            if self._count < self.capacity:
+                slot = (self._start + self._count) % self.capacity
+                self._count += 1
+            else:
+                # Full: overwrite the oldest sample
+                slot = self._start
+                self._start = (self._start + 1) % self.capacity
+            self._times[slot] = timestamp
+            self._temperature[slot] = temperature
+            self._humidity[slot] = humidity
+
+    def _slices(self, since):
+        """Copies of the samples newer than since, oldest first"""
+        with self._lock:
+            start, count, capacity = self._start, self._count, self.capacity
+            times = self._times
+
+            # Binary search over the logical (oldest-first) order
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if times[(start + middle) % capacity] < since:
+                    low = middle + 1
+                else:
+                    high = middle
+            first = (start + low) % capacity
+            end = first + count - low
+            # At most two runs: up to the end of the arrays, then from slot 0
+            parts = [(first, min(end, capacity))]
+            if end > capacity:
+                parts.append((0, end - capacity))
+            return tuple(_concat(values, parts)
+                         for values in (self._times, self._temperature, self._humidity))
+
+    def query(self, since=None, resolution=None, max_points=MAX_HISTORY_POINTS):
+        """Samples newer than since, downsampled to min/max/mean per bucket
+
+        Buckets are resolution seconds wide and aligned to multiples of it. When
+        more than max_points buckets would be needed, the resolution is raised to
+        the next of RESOLUTION_STEPS, so it only changes when the span crosses a
+        step and repeated polls return the same bucket boundaries.
+        """
+        times, temperature, humidity = self._slices(since if since is not None else -math.inf)
+        resolution = float(resolution) if resolution else 0.0
+        if len(times) > 1:
+            # Aligned buckets can straddle one extra boundary, hence max_points - 1
+            needed = (times[-1] - times[0]) / max(max_points - 1, 1)
+            if needed > resolution:
+                resolution = _snap_resolution(needed)
+        resolution = max(resolution, 1.0)
+
+        result = {
+            'resolution': resolution,
+            'time': [], 'count': [],
+            'temperature': {'min': [], 'max': [], 'mean': []},
+            'humidity': {'min': [], 'max': [], 'mean': []}
+        }
+        if not times:
+            return result
+
+        def flush(bucket, count, t_min, t_max, t_sum, h_min, h_max, h_sum):
+            result['time'].append(round(bucket * resolution, 3))
+            result['count'].append(count)
+            for name, low, high, total in (('temperature', t_min, t_max, t_sum),
+                                           ('humidity', h_min, h_max, h_sum)):
+                series = result[name]
+                series['min'].append(round(low, 1))
+                series['max'].append(round(high, 1))
+                series['mean'].append(round(total / count, 2))
+
+        current = None
+        for timestamp, t, h in zip(times, temperature, humidity):
+            bucket = math.floor(timestamp / resolution)
+            if bucket != current:
+                if current is not None:
+                    flush(current, count, t_min, t_max, t_sum, h_min, h_max, h_sum)
+                current, count = bucket, 1
+                t_min = t_max = t_sum = t
+                h_min = h_max = h_sum = h
+                continue
+            count += 1
+            t_sum += t
+            h_sum += h
+            if t < t_min:
+                t_min = t
+            elif t > t_max:
+                t_max = t
+            if h < h_min:
+                h_min = h
+            elif h > h_max:
+                h_max = h
+        flush(current, count, t_min, t_max, t_sum, h_min, h_max, h_sum)
+        return result
+
+
+class DHTSampler:
+    """Background thread that owns the DHT11 sensor and caches the last good reading
+
+    Pass either a ready sensor or a sensor_factory. A factory is called on the
+    sampler thread, so slow driver imports and a missing sensor never hold up
+    (or break) startup; failed attempts are retried with the same backoff as
+    failed reads.
+    """
+
+    def __init__(self, sensor=None, interval=2.0, retries=3, retry_delay=0.5, max_backoff=30.0,
+                 on_sample=None, sensor_factory=None, history=None):
+        self.sensor = sensor
+        self.sensor_factory = sensor_factory
+        self.history = history            # optional ReadingHistory fed with every good read
+        self.on_sample = on_sample        # callback(temperature, humidity) after each good read
+        self.interval = interval          # DHT11 cannot be read faster than ~1 Hz
+        self.retries = retries            # attempts per cycle before backing off
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Snapshot published by the sampler thread, read by request threads
+        self._temperature = None
+        self._humidity = None
+        self._last_success = None         # time.monotonic() of the last good sample
+        self._last_error = None
+        self._error_count = 0
+        self._consecutive_failures = 0
+        self._init_error = None           # why the sensor could not be created
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='dht-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        if self.sensor is not None:
+            self.sensor.exit()
+            self.sensor = None
+
+    def _open_sensor(self):
+        """Create the sensor from the factory on first use; returns True when ready"""
+        if self.sensor is not None:
+            return True
+        try:
+            self.sensor = self.sensor_factory()
+        except Exception as e:
+            # ImportError, missing board pin, etc. - report it and retry later
+            with self._lock:
+                self._init_error = f'Sensor unavailable: {e}'
+            self._record_failure(self._init_error)
+            return False
+        with self._lock:
+            self._init_error = None
+        return True
+
+    def _read_sensor(self):
+        with DHT_READ_SECONDS.time():
+            temperature = self.sensor.temperature
+            humidity = self.sensor.humidity
+        if temperature is None or humidity is None:
+            raise RuntimeError('DHT sensor returned no data')
+        return temperature, humidity
+
+    def _sample(self):
+        """Try one reading with a few quick retries; returns True on success"""
+        if not self._open_sensor():
+            return False
+        for attempt in range(self.retries):
+            try:
+                temperature, humidity = self._read_sensor()
+            except Exception as e:
+                # DHT sensors occasionally fail to read (RuntimeError); retry
+                self._record_failure(str(e))
+            else:
+                self._record_success(temperature, humidity)
+                if self.on_sample is not None:
+                    self.on_sample(temperature, humidity)
+                return True
+            if attempt + 1 < self.retries and self._stop_event.wait(self.retry_delay):
+                break
+        return False
+
+    def _record_success(self, temperature, humidity):
+        DHT_READS.inc('ok')
+        with self._lock:
+            self._temperature = temperature
+            self._humidity = humidity
+            self._last_success = time.monotonic()
+            self._consecutive_failures = 0
+        if self.history is not None:
+            self.history.append(time.time(), temperature, humidity)
+
+    def _record_failure(self, error):
+        DHT_READS.inc('error')
+        with self._lock:
+            self._last_error = error
+            self._error_count += 1
+            self._consecutive_failures += 1
+
+    def _run(self):
+        failed_cycles = 0
+        next_read = time.monotonic()
+        while not self._stop_event.is_set():
+            if self._sample():
+                failed_cycles = 0
+                delay = self.interval
+            else:
+                # Exponential backoff while the sensor keeps failing
+                failed_cycles += 1
+                delay = min(self.interval * (2 ** failed_cycles), self.max_backoff)
+            next_read += delay
+            now = time.monotonic()
+            if next_read < now:
+                next_read = now
+            self._stop_event.wait(next_read - now)
+
+    def get_reading(self):
+        """Return the cached reading with its age; never touches the sensor"""
+        with self._lock:
+            temperature = self._temperature
+            humidity = self._humidity
+            last_success = self._last_success
+            last_error = self._last_error
+            error_count = self._error_count
+            consecutive_failures = self._consecutive_failures
+
+        if last_success is None:
+            return {
+                'success': False,
+                'error': last_error or 'No reading yet',
+                'error_count': error_count
+            }
+
+        reading = {
+            'success': True,
+            'temperature': temperature,
+            'humidity': humidity,
+            'age': round(time.monotonic() - last_success, 3),
+            'error_count': error_count,
+            'consecutive_failures': consecutive_failures
+        }
+        if consecutive_failures:
+            reading['last_error'] = last_error
+        return reading
+
+    def health(self):
+        """Sensor status: starting, ok, degraded (recent reads failing) or unavailable"""
+        with self._lock:
+            if self._init_error is not None:
+                status, error = 'unavailable', self._init_error
+            elif self._consecutive_failures:
+                status, error = 'degraded', self._last_error
+            elif self._last_success is None:
+                status, error = 'starting', None
+            else:
+                status, error = 'ok', None
+        health = {'status': status}
+        if error:
+            health['error'] = error
+        return health
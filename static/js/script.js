@@ -465,7 +465,12 @@ document.addEventListener('DOMContentLoaded', function () {
       'all_on': 'All LEDs ON',
       'all_off': 'All LEDs OFF',
       'all_blink': 'All LEDs Blinking',
-      'buzzer': 'Buzzer activated'
+      'buzzer': 'Buzzer activated',
+      'scene_chase': 'Chase scene',
+      'scene_police': 'Police lights scene',
+      'scene_heartbeat': 'Heartbeat scene',
+      'scene_alert': 'Alert scene',
+      'scene_stop': 'Scene stopped'
     };
     return actionLabels[action] || action;
   }
@@ -567,30 +572,34 @@ document.addEventListener('DOMContentLoaded', function () {
   const humidityValue = document.getElementById('humidityValue');
   const dhtStatus = document.getElementById('dhtStatus');
 
-  async function fetchDHTData() {
-    try {
-      const response = await fetch('/api/dht');
-      const data = await response.json();
-      const t = translations[currentLanguage];
+  function renderDHT(data) {
+    const t = translations[currentLanguage];
 
-      if (data.success) {
-        const temp = data.temperature !== null ? data.temperature : '--';
-        const hum = data.humidity !== null ? data.humidity : '--';
+    if (data.success) {
+      const temp = data.temperature !== null ? data.temperature : '--';
+      const hum = data.humidity !== null ? data.humidity : '--';
 
-        temperatureValue.textContent = temp;
-        humidityValue.textContent = hum;
+      temperatureValue.textContent = temp;
+      humidityValue.textContent = hum;
 
-        // Update robot ear displays
-        robotTemp.textContent = temp;
-        robotHumidity.textContent = hum;
+      // Update robot ear displays
+      robotTemp.textContent = temp;
+      robotHumidity.textContent = hum;
 
-        const now = new Date().toLocaleTimeString();
-        dhtStatus.textContent = `${t.dhtUpdated} ${now}`;
-        dhtStatus.className = 'dht-status success';
-      } else {
-        dhtStatus.textContent = t.dhtError;
-        dhtStatus.className = 'dht-status error';
-      }
+      const now = new Date().toLocaleTimeString();
+      dhtStatus.textContent = `${t.dhtUpdated} ${now}`;
+      dhtStatus.className = 'dht-status success';
+    } else {
+      dhtStatus.textContent = t.dhtError;
+      dhtStatus.className = 'dht-status error';
+    }
+  }
+
+  async function fetchDHTData() {
+    try {
+      const response = await fetch('/api/dht');
+      const data = await response.json();
+      renderDHT(data);
     } catch (error) {
       console.error('Error fetching DHT data:', error);
       const t = translations[currentLanguage];
@@ -599,10 +608,6 @@ document.addEventListener('DOMContentLoaded', function () {
     }
   }
 
-  // Fetch DHT data every 3 seconds
-  fetchDHTData();
-  setInterval(fetchDHTData, 3000);
-
   // Notification
   function showNotification(message) {
     notificationText.textContent = message;
@@ -632,7 +637,61 @@ document.addEventListener('DOMContentLoaded', function () {
     }
   }
 
-  fetchInitialState();
+  // Live updates: the server pushes only the fields that changed
+  const ledStates = {};
+  let dhtReading = { success: false };
+
+  function startStateStream() {
+    const source = new EventSource('/api/stream');
+
+    source.onmessage = function (event) {
+      const changes = JSON.parse(event.data);
+
+      if (changes.states) {
+        Object.assign(ledStates, changes.states);
+        updateLEDStates(ledStates);
+      }
+
+      if (changes.dht) {
+        dhtReading = Object.assign({}, dhtReading, changes.dht);
+        if (changes.dht.temperature !== undefined || changes.dht.humidity !== undefined) {
+          dhtReading.success = true;
+        }
+        renderDHT(dhtReading);
+      }
+    };
+
+    // EventSource reconnects on its own and the server resends a full snapshot
+    source.onerror = function () {
+      if (source.readyState === EventSource.CLOSED) {
+        // Refused (the server is at its stream limit): poll for a while, then retry
+        console.warn('State stream unavailable, polling instead');
+        pollFor(30000);
+        setTimeout(startStateStream, 30000);
+        return;
+      }
+      console.warn('State stream interrupted, reconnecting...');
+    };
+  }
+
+  function pollFor(duration) {
+    fetchInitialState();
+    fetchDHTData();
+    const timer = setInterval(function () {
+      fetchInitialState();
+      fetchDHTData();
+    }, 3000);
+    setTimeout(function () { clearInterval(timer); }, duration);
+  }
+
+  if (window.EventSource) {
+    startStateStream();
+  } else {
+    // Fetch DHT data every 3 seconds
+    fetchInitialState();
+    fetchDHTData();
+    setInterval(fetchDHTData, 3000);
+  }
 
   // Welcome message on load
   setTimeout(() => {
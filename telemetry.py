@@ -0,0 +1,242 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Segment layout: MAGIC, u32 header length, JSON header, then fixed-size records.
+# Every record starts with (timestamp f64, kind u8); the rest depends on the kind.
+MAGIC = b'ACT7TLM1'
+HEADER_LENGTH = struct.Struct('<I')
+KIND_STATES = 1
+KIND_DHT = 2
+STATES_RECORD = struct.Struct('<dB3xII')   # timestamp, kind, version, state bitmask
+DHT_RECORD = struct.Struct('<dB3xff')      # timestamp, kind, temperature, humidity
+RECORD_SIZE = STATES_RECORD.size
+KINDS = {'states': KIND_STATES, 'dht': KIND_DHT}
+
+SEGMENT_PREFIX = 'telemetry-'
+SEGMENT_SUFFIX = '.bin'
+
+
+def _segment_paths(directory):
+    """Segment files oldest first; names carry a zero-padded sequence number"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+
+
+class TelemetryRecorder:
+    """Append-only binary log of controller state changes and DHT readings
+
+    Listener callbacks only pack a 20-byte record into an in-memory buffer. A
+    background thread writes the buffer out every flush_interval seconds and
+    fsyncs, so the SD card sees a few large writes instead of one per change.
+    Segments rotate at max_bytes and only the newest max_segments are kept.
+    """
+
+    def __init__(self, directory, fields, max_bytes=4 * 1024 * 1024, max_segments=8,
+                 flush_interval=5.0):
+        self.directory = directory
+        self.fields = list(fields)        # state names, one bit each in a states record
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+
+        self._bits = {name: 1 << index for index, name in enumerate(self.fields)}
+        self._state_mask = 0
+        self._dht = {}
+        self._buffer = bytearray()
+        self._lock = threading.Lock()         # guards the buffer and current state
+        self._file_lock = threading.Lock()    # serializes writes and rotation
+        self._file = None
+        self._unsynced = False                # written to the page cache but not fsynced
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.records_written = 0
+        self.bytes_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, states=None, version=0):
+        """Open a new segment, log the starting states and begin flushing"""
+        with self._file_lock:
+            self._open_segment()
+        if states is not None:
+            with self._lock:
+                self._state_mask = self._mask(states)
+                self._append_states(version)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.flush()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record_changes(self, changes):
+        """Controller listener: log state changes and new DHT values"""
+        with self._lock:
+            # Stamped under the lock so timestamps never go backwards in the file
+            now = time.time()
+            if 'states' in changes:
+                for name, on in changes['states'].items():
+                    bit = self._bits.get(name)
+                    if bit is None:
+                        continue
+                    if on:
+                        self._state_mask |= bit
+                    else:
+                        self._state_mask &= ~bit
+                self._append_states(changes.get('version', 0), now)
+            if 'dht' in changes:
+                self._dht.update(changes['dht'])
+                if 'temperature' in self._dht and 'humidity' in self._dht:
+                    self._buffer += DHT_RECORD.pack(now, KIND_DHT, self._dht['temperature'],
+                                                    self._dht['humidity'])
+
+    def _mask(self, states):
+        mask = 0
+        for name, on in states.items():
+            if on and name in self._bits:
+                mask |= self._bits[name]
+        return mask
+
+    def _append_states(self, version, now=None):
+        self._buffer += STATES_RECORD.pack(now or time.time(), KIND_STATES, version,
+                                           self._state_mask)
+
+    def flush(self, sync=True):
+        """Write out buffered records; rotates when the segment is full
+
+        With sync the file is fsynced, including records an earlier unsynced
+        flush left in the page cache. Readers pass sync=False: the mmap reader
+        sees the page cache, so only the writer thread pays for the fsync.
+        """
+        with self._file_lock:
+            with self._lock:
+                data, self._buffer = self._buffer, bytearray()
+            if self._file is None:
+                return
+            if data:
+                self._file.write(data)
+                self._file.flush()
+                self._unsynced = True
+                self.records_written += len(data) // RECORD_SIZE
+                self.bytes_written += len(data)
+            full = self._file.tell() >= self.max_bytes
+            if self._unsynced and (sync or full):
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+            if full:
+                self._open_segment()
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        paths = _segment_paths(self.directory)
+        sequence = 1
+        if paths:
+            name = os.path.basename(paths[-1])
+            sequence = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) + 1
+        path = os.path.join(self.directory, f'{SEGMENT_PREFIX}{sequence:08d}{SEGMENT_SUFFIX}')
+        header = json.dumps({'fields': self.fields, 'record_size': RECORD_SIZE}).encode()
+        self._file = open(path, 'ab')
+        self._file.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        self._file.flush()
+        # Drop the oldest segments beyond the limit
+        for old in (paths + [path])[:-self.max_segments]:
+            os.remove(old)
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Telemetry write error: {e}")
+
+
+class TelemetryReader:
+    """Range queries over the segments a TelemetryRecorder wrote
+
+    Each segment is memory-mapped and the first record in range is found by
+    binary search on the timestamps, so a query only touches the records it
+    returns.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def read(self, since=None, until=None, kind=None, limit=None):
+        """Records with since <= timestamp < until, oldest first, as dicts"""
+        kind_code = KINDS.get(kind) if kind else None
+        records = []
+        for path in _segment_paths(self.directory):
+            for record in self._read_segment(path, since, until, kind_code):
+                records.append(record)
+                if limit is not None and len(records) >= limit:
+                    return records
+        return records
+
+    def _read_segment(self, path, since, until, kind_code):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(MAGIC) + HEADER_LENGTH.size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(MAGIC)] != MAGIC:
+                    return
+                (length,) = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+                offset = len(MAGIC) + HEADER_LENGTH.size
+                fields = json.loads(data[offset:offset + length])['fields']
+                first = offset + length
+                # A record still being written may be cut short; ignore it
+                count = (size - first) // RECORD_SIZE
+
+                def timestamp(index):
+                    return struct.unpack_from('<d', data, first + index * RECORD_SIZE)[0]
+
+                low, high = 0, count
+                if since is not None:
+                    while low < high:
+                        middle = (low + high) // 2
+                        if timestamp(middle) < since:
+                            low = middle + 1
+                        else:
+                            high = middle
+
+                for index in range(low, count):
+                    position = first + index * RECORD_SIZE
+                    when, kind = struct.unpack_from('<dB', data, position)
+                    if until is not None and when >= until:
+                        break
+                    if kind_code is not None and kind != kind_code:
+                        continue
+                    if kind == KIND_STATES:
+                        _, _, version, mask = STATES_RECORD.unpack_from(data, position)
+                        yield {
+                            'time': when,
+                            'kind': 'states',
+                            'version': version,
+                            'states': {name: bool(mask >> bit & 1) for bit, name in enumerate(fields)}
+                        }
+                    elif kind == KIND_DHT:
+                        _, _, temperature, humidity = DHT_RECORD.unpack_from(data, position)
+                        yield {
+                            'time': when,
+                            'kind': 'dht',
+                            'temperature': round(temperature, 1),
+                            'humidity': round(humidity, 1)
+                        }
@@ -0,0 +1,254 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from metrics import counter, histogram
+
+VOICE_PHRASES = counter('voice_phrases_total', 'Phrases heard by the background listener, by outcome',
+                        ['result'])
+VOICE_RECOGNIZE_SECONDS = histogram('voice_recognize_seconds', 'Offline speech recognition time')
+
+# Offline engines first; 'google' needs the network and is only used when asked for
+ENGINES = ('vosk', 'sphinx', 'google')
+VOSK_SAMPLE_RATE = 16000
+
+
+class ListenJob:
+    """A request for the next phrase the background listener hears"""
+
+    def __init__(self, language, timeout):
+        self.id = uuid.uuid4().hex[:12]
+        self.language = language
+        self.deadline = time.monotonic() + timeout
+        self.status = 'waiting'           # waiting | done | timeout | failed
+        self.text = None
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def _finish(self, status, text=None, result=None, error=None):
+        self.status = status
+        self.text = text
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def to_dict(self):
+        info = {'id': self.id, 'language': self.language, 'status': self.status}
+        if self.text is not None:
+            info['text'] = self.text
+        if self.result is not None:
+            info['result'] = self.result
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+
+class VoiceListener:
+    """Keeps the microphone open and turns speech into commands in the background
+
+    speech_recognition's listen_in_background thread only cuts phrases out of
+    the audio stream and drops them into a bounded queue; one worker thread
+    recognizes them with an offline engine and calls handle_text(text,
+    language), so a slow recognition never stalls the microphone. When the
+    queue is full new phrases are dropped. The ambient-noise calibration is
+    done once when the stream opens and reused afterwards. For Vosk,
+    vosk_models maps each language to its model directory; the models are
+    loaded once in start() and languages without one are rejected.
+    """
+
+    def __init__(self, sr, recognizer, handle_text, language, engine='vosk',
+                 queue_size=4, phrase_time_limit=5, calibration=1.0, job_history=32,
+                 microphone_factory=None, vosk_models=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown speech engine {engine!r}, expected one of {', '.join(ENGINES)}")
+        self.sr = sr
+        self.recognizer = recognizer
+        self.handle_text = handle_text    # (text, language) -> command result dict
+        self.language = language          # callable returning the current language
+        self.engine = engine
+        self.phrase_time_limit = phrase_time_limit
+        self.calibration = calibration
+        self.job_history = job_history
+        self.microphone_factory = microphone_factory or sr.Microphone
+        self.vosk_models = vosk_models or {}
+        self._vosk = None
+        self._models = {}                 # language -> loaded vosk.Model
+        self._audio = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()        # job id -> ListenJob, oldest first
+        self._stop_listening = None
+        self._worker = None
+        self._running = False
+        self.energy_threshold = None
+        self.error = None
+        self.phrases_dropped = 0
+
+    def start(self):
+        """Open the microphone, calibrate once and start listening; idempotent"""
+        with self._lock:
+            if self._running:
+                return
+            if self.engine == 'vosk' and not self._models:
+                self._load_vosk_models()
+            microphone = self.microphone_factory()
+            with microphone as source:
+                self.recognizer.adjust_for_ambient_noise(source, duration=self.calibration)
+            self.energy_threshold = self.recognizer.energy_threshold
+            self._running = True
+            self._worker = threading.Thread(target=self._run, name='voice-recognizer')
+            self._worker.daemon = True
+            self._worker.start()
+            self._stop_listening = self.recognizer.listen_in_background(
+                microphone, self._on_phrase, phrase_time_limit=self.phrase_time_limit)
+
+    def _load_vosk_models(self):
+        import vosk
+        models = {language: vosk.Model(path) for language, path in self.vosk_models.items()
+                  if os.path.isdir(path)}
+        if not models:
+            raise RuntimeError('No Vosk model found in ' + ', '.join(sorted(self.vosk_models.values())))
+        self._vosk, self._models = vosk, models
+
+    def supports(self, language):
+        return self.engine != 'vosk' or language in self._models
+
+    def languages(self):
+        """Languages with a loaded model, or None when the engine takes any"""
+        return sorted(self._models) if self.engine == 'vosk' else None
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            stop_listening, self._stop_listening = self._stop_listening, None
+        if stop_listening is not None:
+            stop_listening(wait_for_stop=False)
+        try:
+            self._audio.put_nowait(None)
+        except queue.Full:
+            pass
+        for job in self.jobs():
+            if not job.done():
+                job._finish('failed', error='Listener stopped')
+
+    def running(self):
+        return self._running
+
+    def submit(self, language=None, timeout=10.0):
+        """Job that completes with the next recognized phrase, or times out
+
+        Raises ValueError when the engine has no model for language.
+        """
+        language = language or self.language()
+        if not self.supports(language):
+            raise ValueError(f'No {self.engine} model for {language}')
+        job = ListenJob(language, timeout)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs once the history is full
+            for old_id in list(self._jobs):
+                if len(self._jobs) <= self.job_history:
+                    break
+                if self._jobs[old_id].done():
+                    del self._jobs[old_id]
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            self._expire([job])
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def pending(self):
+        return self._audio.qsize()
+
+    def health(self):
+        if self.error is not None:
+            return {'status': 'degraded', 'error': self.error, 'engine': self.engine}
+        return {
+            'status': 'listening' if self._running else 'stopped',
+            'engine': self.engine,
+            'energy_threshold': self.energy_threshold,
+            'languages': self.languages(),
+            'queued_phrases': self.pending(),
+            'dropped_phrases': self.phrases_dropped
+        }
+
+    def _expire(self, jobs):
+        now = time.monotonic()
+        for job in jobs:
+            if not job.done() and now >= job.deadline:
+                job._finish('timeout', error='No speech detected')
+
+    def _on_phrase(self, recognizer, audio):
+        # Runs on the listen_in_background thread: never block it
+        try:
+            self._audio.put_nowait(audio)
+        except queue.Full:
+            self.phrases_dropped += 1
+            VOICE_PHRASES.inc('dropped')
+
+    def _recognize(self, audio, language):
+        if self.engine == 'vosk':
+            # recognize_vosk would reload the model from disk for every phrase
+            recognizer = self._vosk.KaldiRecognizer(self._models[language], VOSK_SAMPLE_RATE)
+            recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=VOSK_SAMPLE_RATE, convert_width=2))
+            return json.loads(recognizer.FinalResult()).get('text', '')
+        if self.engine == 'sphinx':
+            return self.recognizer.recognize_sphinx(audio, language=language)
+        return self.recognizer.recognize_google(audio, language=language)
+
+    def _run(self):
+        while True:
+            audio = self._audio.get()
+            if audio is None or not self._running:
+                return
+            self._expire(self.jobs())
+            waiting = [job for job in self.jobs() if not job.done()]
+            language = waiting[0].language if waiting else self.language()
+            if not self.supports(language):
+                VOICE_PHRASES.inc('unsupported')
+                continue
+            try:
+                with VOICE_RECOGNIZE_SECONDS.time():
+                    text = self._recognize(audio, language).strip()
+            except self.sr.UnknownValueError:
+                text = ''
+            except Exception as e:
+                self.error = str(e)
+                VOICE_PHRASES.inc('error')
+                for job in waiting:
+                    job._finish('failed', error=f'Speech recognition error: {e}')
+                continue
+            self.error = None
+            if not text:
+                VOICE_PHRASES.inc('empty')
+                continue
+            try:
+                result = self.handle_text(text, language)
+            except Exception as e:
+                VOICE_PHRASES.inc('error')
+                for job in waiting:
+                    job._finish('failed', text=text, error=str(e))
+                continue
+            VOICE_PHRASES.inc('command' if result.get('success') else 'unmatched')
+            for job in waiting:
+                job._finish('done', text=text, result=result)
@@ -0,0 +1,266 @@
+import re
+import threading
+from collections import OrderedDict, deque, namedtuple
+
+# One phrase hit in the text; end is exclusive
+Match = namedtuple('Match', ['start', 'end', 'phrase', 'action', 'priority'])
+
+# Result of matching one utterance; confidence is 1.0 for exact phrase hits
+CommandMatch = namedtuple('CommandMatch', ['action', 'phrase', 'confidence'])
+
+# Entries of a command table that are not actions
+INVALID_COLOR_KEY = 'invalid_color_keywords'
+IGNORED_KEYS = ('valid_colors',)
+
+# Filler words dropped from both phrases and utterances before matching
+STOP_WORDS = {
+    'en-US': {
+        'a', 'an', 'the', 'please', 'pls', 'kindly', 'hey', 'can', 'could', 'would',
+        'will', 'you', 'my', 'now', 'to', 'led', 'leds', 'light', 'lights', 'lamp'
+    },
+    'fil-PH': {
+        'po', 'naman', 'nga', 'mo', 'ko', 'pa', 'lang', 'sana', 'paki', 'ang', 'ng',
+        'na', 'nyo', 'ninyo', 'yung', 'iyong', 'ilaw', 'please'
+    }
+}
+
+# Shortest command phrase considered for fuzzy matching; shorter ones
+# ("buzz", "beep") only match exactly to avoid false positives
+MIN_FUZZY_PHRASE = 5
+
+# Phrase words shorter than this ("on", "go") must appear as-is in a fuzzy
+# match, so "red one" is not taken for "red on"
+MIN_FUZZY_WORD = 3
+
+# Upper bound on phrases scored by edit distance for one utterance
+MAX_FUZZY_CANDIDATES = 16
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over every phrase of one language
+
+    All phrase occurrences are found in a single pass over the text, so the
+    cost stays linear in the text length however many phrases there are.
+    Phrases and text are padded with a space, so only whole words match
+    ("red on" is not found in "bored one"); text must be single-spaced.
+    """
+
+    def __init__(self, phrases):
+        # phrases: iterable of (phrase, action, priority)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]               # node -> [(phrase, action, priority)]
+        for phrase, action, priority in phrases:
+            self._add(phrase, action, priority)
+        self._build_failure_links()
+
+    def _add(self, phrase, action, priority):
+        node = 0
+        for char in f' {phrase} ':
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        entry = (phrase, action, priority)
+        if entry not in self._output[node]:
+            self._output[node].append(entry)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # Inherit the phrases that end at the suffix state
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text):
+        """Every phrase occurrence in text, in order of where it ends"""
+        matches = []
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        # index counts from the padding space, so it is the unpadded end position
+        for index, char in enumerate(f' {text} '):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for phrase, action, priority in output[node]:
+                matches.append(Match(index - 1 - len(phrase), index - 1, phrase, action, priority))
+        return matches
+
+    def best_match(self, text):
+        """Highest priority hit, then the longest phrase, then the earliest one"""
+        best = None
+        for match in self.find_all(text):
+            if best is None or _rank(match) > _rank(best):
+                best = match
+        return best
+
+
+def _rank(match):
+    return (match.priority, len(match.phrase), -match.start)
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance; gives up early once every path exceeds limit"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class CommandMatcher:
+    """Normalizing, fuzzy command matcher for one language's command table
+
+    Utterances are lowercased, stripped of punctuation and stop words, then
+    looked up exactly with a PhraseMatcher. When nothing matches exactly, word
+    windows of the utterance are scored by edit distance against the few command
+    phrases sharing the most words with it, and the best one above
+    fuzzy_threshold is used.
+    """
+
+    def __init__(self, commands, language, fuzzy_threshold=0.8):
+        self.language = language
+        self.fuzzy_threshold = fuzzy_threshold
+        self.stop_words = STOP_WORDS.get(language, set())
+
+        phrases = []
+        self._fuzzy_phrases = []          # (normalized phrase, word count, action)
+        for action, action_phrases in commands.items():
+            if action in IGNORED_KEYS:
+                continue
+            for phrase in action_phrases:
+                normalized = self.normalize(phrase)
+                if not normalized:
+                    continue
+                if action == INVALID_COLOR_KEY:
+                    # Action phrases outrank invalid colour keywords, so
+                    # "turn on blue not white" still runs the command
+                    phrases.append((normalized, 'invalid_color', 0))
+                else:
+                    phrases.append((normalized, action, 1))
+                    if len(normalized) >= MIN_FUZZY_PHRASE:
+                        entry = (normalized, len(normalized.split()), action)
+                        if entry not in self._fuzzy_phrases:
+                            self._fuzzy_phrases.append(entry)
+        self.exact = PhraseMatcher(phrases)
+
+        # word -> indexes into _fuzzy_phrases, so fuzzy scoring only visits
+        # phrases that share words with the utterance
+        self._word_index = {}
+        for index, (phrase, _, _) in enumerate(self._fuzzy_phrases):
+            for word in set(phrase.split()):
+                self._word_index.setdefault(word, []).append(index)
+
+    def normalize(self, text):
+        words = _NON_WORD.sub(' ', text.lower()).split()
+        return ' '.join(word for word in words if word not in self.stop_words)
+
+    def match(self, normalized):
+        """Match already-normalized text; returns a CommandMatch or None"""
+        hit = self.exact.best_match(normalized)
+        if hit is not None:
+            return CommandMatch(hit.action, hit.phrase, 1.0)
+        return self._fuzzy_match(normalized)
+
+    def _fuzzy_candidates(self, words):
+        """Phrases sharing the most words (and at least half of theirs) with the utterance"""
+        shared = {}
+        for word in set(words):
+            for index in self._word_index.get(word, ()):
+                shared[index] = shared.get(index, 0) + 1
+        candidates = [(-count, index) for index, count in shared.items()
+                      if count * 2 >= self._fuzzy_phrases[index][1]]
+        # Only the best-overlapping few are worth an edit-distance check
+        candidates.sort()
+        return [self._fuzzy_phrases[index] for _, index in candidates[:MAX_FUZZY_CANDIDATES]]
+
+    def _fuzzy_match(self, normalized):
+        words = normalized.split()
+        best = None
+        for phrase, size, action in self._fuzzy_candidates(words):
+            required = [word for word in phrase.split() if len(word) < MIN_FUZZY_WORD]
+            # Windows one word shorter or longer absorb split or merged words
+            for width in (size - 1, size, size + 1):
+                if width < 1 or width > len(words):
+                    continue
+                max_errors = int(len(phrase) * (1 - self.fuzzy_threshold))
+                for start in range(len(words) - width + 1):
+                    window_words = words[start:start + width]
+                    if any(word not in window_words for word in required):
+                        continue
+                    window = ' '.join(window_words)
+                    if abs(len(window) - len(phrase)) > max_errors:
+                        continue
+                    distance = edit_distance(window, phrase, max_errors)
+                    if distance > max_errors:
+                        continue
+                    confidence = 1 - distance / max(len(phrase), len(window))
+                    if best is None or confidence > best.confidence:
+                        best = CommandMatch(action, phrase, round(confidence, 3))
+        if best is not None and best.confidence >= self.fuzzy_threshold:
+            return best
+        return None
+
+
+def build_matchers(command_table):
+    """Build one CommandMatcher per language in a COMMANDS-style table"""
+    return {language: CommandMatcher(commands, language)
+            for language, commands in command_table.items()}
+
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)